@@ -0,0 +1,256 @@
+import os
+import argparse
+import gzip
+import json
+import platform
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import update_shop
+import fix_filenames
+
+# Names used for the synthetic inventories and vaults
+SPORTS = ['Baseball', 'Football', 'Hockey', 'Basketball', 'Soccer']
+GROUPS = ['Vintage', 'Rookies', 'Hall of Famers', 'All Stars', 'Leaders', 'Team Sets', 'Inserts']
+PLAYERS = ['Gretzky', 'Mantle', 'Jordan', 'Brady', 'Orr', 'Aaron', 'Montana', 'Lemieux']
+PRICES = [10, 25, 35, 50, 75, 95, 100, 250]
+
+# Filename styles found in real vaults: underscores, spaces, "$" prices, cents, and no price at all
+FILENAME_PATTERNS = {
+    'underscore': "{year}_{player}_{group}_{n}_{price}.jpg",
+    'spaces': "{year} {player} {group} {n} {price}.jpg",
+    'dollar': "{player} {group} {n} Lot ${price}.jpg",
+    'cents': "{player}_{year}_{n}_{price}.50.png",
+    'unpriced': "{player} {year} {group} {n}.jpg",
+}
+
+RESULTS_VERSION = 1
+REGRESSION_THRESHOLD = 1.10  # --compare flags phases whose median got more than 10% slower
+
+def folder_name(level, i):
+    # Every sibling gets a distinct name, even when fanout is bigger than the name list
+    names = SPORTS if level == 0 else GROUPS
+    return names[i % len(names)] + (f" {i}" if level or i >= len(names) else "")
+
+def synthetic_filename(rng, pattern, n):
+    return FILENAME_PATTERNS[pattern].format(year=1950 + rng.randrange(70), player=rng.choice(PLAYERS),
+                                             group=rng.choice(GROUPS), n=n, price=rng.choice(PRICES))
+
+def synthetic_inventory(file_count, depth=3, fanout=6, seed=1):
+    # Same node shape scan_directory() produces, without touching the disk
+    rng = random.Random(seed)
+    per_folder = max(1, -(-file_count // (fanout ** depth)))
+    made = [0]
+
+    def folder(path, level):
+        contents, total_files, total_folders = [], 0, 0
+        if level < depth:
+            for i in range(fanout):
+                name = folder_name(level, i)
+                sub, sub_files, sub_folders = folder(f"{path}/{name}" if path else name, level + 1)
+                contents.append({"name": name, "type": "folder", "contents": sub, "total_files": sub_files, "total_folders": sub_folders})
+                total_files += sub_files
+                total_folders += 1 + sub_folders
+        else:
+            for i in range(per_folder):
+                if made[0] >= file_count: break
+                made[0] += 1
+                title = f"{1950 + rng.randrange(70)} {rng.choice(GROUPS)} Lot {i}_{rng.choice([10, 25, 50, 75, 100, 250])}"
+                contents.append({"name": f"{path}/{title}.jpg", "type": "file", "title": title,
+                                 "price_cents": update_shop.parse_price_cents(f"{title}.jpg")})
+                total_files += 1
+        return contents, total_files, total_folders
+
+    contents, total_files, total_folders = folder("", 0)
+    return {"name": "Home", "type": "folder", "contents": contents, "total_files": total_files, "total_folders": total_folders}
+
+def fake_jpeg(width, height, salt):
+    # Only the markers a header reader looks at (SOI, SOF0, EOI) plus a unique tail so every file
+    # hashes differently. A few dozen bytes, so 100k files write quickly; not decodable as an image.
+    sof = struct.pack('>HBHHB', 17, 8, height, width, 3) + b'\x01\x22\x00\x02\x11\x01\x03\x11\x01'
+    return b'\xff\xd8\xff\xc0' + sof + b'\xff\xd9' + salt.encode('utf-8')
+
+def generate_vault(root, file_count, depth=3, fanout=6, patterns=tuple(FILENAME_PATTERNS), seed=1):
+    # Writes a card folder tree under root: depth levels of fanout folders, files spread over the leaves
+    rng = random.Random(seed)
+    per_folder = max(1, -(-file_count // (fanout ** depth)))
+    made = 0
+
+    def folder(path, level):
+        nonlocal made
+        os.makedirs(path, exist_ok=True)
+        if level < depth:
+            for i in range(fanout):
+                folder(os.path.join(path, folder_name(level, i)), level + 1)
+            return
+        for i in range(per_folder):
+            if made >= file_count: return
+            filename = synthetic_filename(rng, patterns[made % len(patterns)], i)
+            made += 1
+            with open(os.path.join(path, filename), 'wb') as f:
+                f.write(fake_jpeg(600, 800, f"{path}/{filename}"))
+
+    folder(root, 0)
+    return made
+
+def scanned_inventory(vault_path, state=None):
+    with ThreadPoolExecutor(max_workers=update_shop.SCAN_WORKERS) as pool:
+        contents, totals = update_shop.scan_directory(vault_path, state=state, pool=pool)
+    return {"name": "Home", "type": "folder", "contents": contents, **totals}
+
+# --- PAGE SIZES ---
+
+def page_sizes(inventory_structure):
+    # index.html size in each inventory format, raw and gzipped (what the browser actually downloads), plus the
+    # search index the build writes next to it and the page fetches once search is used
+    update_shop.assign_lot_ids(inventory_structure, {"next": 1, "lots": {}}, {})
+    search_index = json.dumps(update_shop.build_search_index(inventory_structure), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    sizes = {"search": (len(search_index), len(gzip.compress(search_index, 9)))}
+    for label, compact in (("pretty", False), ("compact", True)):
+        page = update_shop.render_page(inventory_structure, compact, update_shop.SEARCH_INDEX_FILE).encode('utf-8')
+        sizes[label] = (len(page), len(gzip.compress(page, 9)))
+    return sizes
+
+def report_page_sizes(label, inventory_structure):
+    sizes = page_sizes(inventory_structure)
+    pretty_raw, pretty_gz = sizes["pretty"]
+    compact_raw, compact_gz = sizes["compact"]
+    search_raw, search_gz = sizes["search"]
+    print(f"--- {label}: {inventory_structure['total_files']} files, {inventory_structure['total_folders']} folders ---")
+    print(f"   pretty:  {pretty_raw:>12,} bytes  ({pretty_gz:,} gzipped)")
+    print(f"   compact: {compact_raw:>12,} bytes  ({compact_gz:,} gzipped)")
+    print(f"   saved:   {100 - 100 * compact_raw / pretty_raw:>11.1f} %     ({100 - 100 * compact_gz / pretty_gz:.1f} % gzipped)")
+    print(f"   search:  {search_raw:>12,} bytes  ({search_gz:,} gzipped, {update_shop.SEARCH_INDEX_FILE}, fetched on first search)")
+
+# --- BUILD PHASES ---
+
+def timed(timings, phase, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings.setdefault(phase, []).append(time.perf_counter() - start)
+    return result
+
+def quietly(func, *args):
+    # The build steps print progress; keep it out of the benchmark report
+    stdout = sys.stdout
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            return func(*args)
+        finally:
+            sys.stdout = stdout
+
+def run_build_phases(vault, out_dir, timings):
+    # One pass over each build phase against a freshly generated vault. Its folders were only just written (or
+    # renamed by the last run's fix_filenames), so backdate them: listings of folders that changed within
+    # RACY_MTIME_SECONDS of a scan aren't reused, and the warm scan would re-read everything.
+    backdated = time.time() - 3600
+    for root, _, _ in os.walk(vault):
+        os.utime(root, (backdated, backdated))
+    manifest = update_shop.load_manifest(vault)
+    state = update_shop.new_scan_state(manifest)
+    inventory_structure = timed(timings, "scan_cold", scanned_inventory, vault, state)
+
+    # Second scan with the folder listings the first one recorded, like every build after the first
+    manifest["dirs"] = state["dirs"]
+    warm_state = update_shop.new_scan_state(manifest)
+    timed(timings, "scan_warm", scanned_inventory, vault, warm_state)
+    if warm_state["rescanned"]:
+        raise RuntimeError(f"Warm scan re-read {warm_state['rescanned']} of {len(warm_state['dirs'])} folders, it should reuse them all")
+
+    # No hashes here, so every lot gets its id from the path fallback
+    timed(timings, "lot_ids", update_shop.assign_lot_ids, inventory_structure, update_shop.load_lot_ids(vault), {})
+    search_index = timed(timings, "search_index", update_shop.build_search_index, inventory_structure)
+    timed(timings, "json_pretty", update_shop.serialize_inventory, inventory_structure, False)
+    timed(timings, "json_compact", update_shop.serialize_inventory, [inventory_structure], True)
+    page = timed(timings, "render_page", update_shop.render_page, inventory_structure, False, search_index)
+    if os.path.exists(os.path.join(out_dir, "index.html")):
+        os.remove(os.path.join(out_dir, "index.html"))
+    timed(timings, "write_new", update_shop.write_if_changed, out_dir, "index.html", page)
+    timed(timings, "write_unchanged", update_shop.write_if_changed, out_dir, "index.html", page)
+
+    # clean_filenames() renames in place, so it goes last
+    timed(timings, "fix_filenames", quietly, fix_filenames.clean_filenames, vault)
+
+def benchmark_build(args):
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix="shop_bench_") as out_dir:
+        for run in range(args.runs):
+            # A fresh vault every run: fix_filenames changes the names, and the cold scan needs a cold manifest
+            with tempfile.TemporaryDirectory(prefix="shop_vault_") as vault:
+                start = time.perf_counter()
+                made = generate_vault(vault, args.files, args.depth, args.fanout, args.patterns, args.seed)
+                print(f"   Run {run + 1}/{args.runs}: generated {made:,} files in {time.perf_counter() - start:.1f}s")
+                quietly(run_build_phases, vault, out_dir, timings)
+
+    return {
+        "version": RESULTS_VERSION,
+        "params": {"files": args.files, "depth": args.depth, "fanout": args.fanout,
+                   "patterns": list(args.patterns), "runs": args.runs, "seed": args.seed},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "phases": {phase: {"min": min(runs), "median": statistics.median(runs), "runs": runs} for phase, runs in timings.items()},
+    }
+
+def report_build(results, baseline=None):
+    params = results["params"]
+    print(f"--- Build phases: {params['files']:,} files, depth {params['depth']}, fanout {params['fanout']}, {params['runs']} runs ---")
+    regressions = []
+    for phase, timing in results["phases"].items():
+        line = f"   {phase:<16} median {timing['median'] * 1000:>10.1f} ms   min {timing['min'] * 1000:>10.1f} ms"
+        old = baseline["phases"].get(phase) if baseline else None
+        if old and old["median"] > 0:
+            ratio = timing["median"] / old["median"]
+            line += f"   {ratio:>5.2f}x baseline"
+            if ratio > REGRESSION_THRESHOLD:
+                line += "  ⚠️"
+                regressions.append(phase)
+        print(line)
+    if baseline:
+        if baseline.get("params") != params:
+            print("⚠️ Baseline was run with different settings, ratios may not mean much.")
+        if regressions:
+            print(f"❌ Slower than baseline: {', '.join(regressions)}")
+        else:
+            print("✅ No phase is more than 10% slower than the baseline.")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the shop build. Runs offline against generated vaults in a temp folder.")
+    parser.add_argument('mode', nargs='?', choices=['build', 'sizes'], default='build',
+                        help="build: time each build phase (default); sizes: compare index.html size for the pretty and compact formats, plus the search index it loads")
+    parser.add_argument('--files', type=int, default=10000, help="build: card images in the generated vault")
+    parser.add_argument('--depth', type=int, default=3, help="folder levels below the vault root")
+    parser.add_argument('--fanout', type=int, default=6, help="subfolders in each folder")
+    parser.add_argument('--patterns', nargs='+', choices=list(FILENAME_PATTERNS), default=list(FILENAME_PATTERNS),
+                        help="build: filename styles to mix")
+    parser.add_argument('--runs', type=int, default=3, help="build: how many times to repeat each phase")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="build: save the results as JSON")
+    parser.add_argument('--compare', help="build: JSON results from an earlier run to compare against")
+    parser.add_argument('--vault', default=update_shop.SCRIPT_DIR, help="sizes: card folder to scan (default: this folder)")
+    parser.add_argument('--synthetic', type=int, nargs='*', default=[1000, 10000, 100000],
+                        help="sizes: also measure generated inventories with this many files")
+    args = parser.parse_args()
+
+    if args.mode == 'sizes':
+        report_page_sizes(f"Vault {os.path.abspath(args.vault)}", scanned_inventory(args.vault))
+        for file_count in args.synthetic:
+            report_page_sizes("Synthetic", synthetic_inventory(file_count, args.depth, args.fanout, args.seed))
+        sys.exit(0)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = benchmark_build(args)
+    regressions = report_build(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"✅ Results saved to {args.output}")
+    sys.exit(1 if regressions else 0)
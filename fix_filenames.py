@@ -1,45 +1,32 @@
+import argparse
 
+import update_shop
 
-import os
+# Only image files are renamed (update_shop.IMAGE_EXTENSIONS), and only inside the folder this script is in.
+# update_shop.py --fix-filenames does the same thing as part of the build, without a separate pass.
 
-# CONFIGURATION
-# Only rename these file types to be safe
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
-
-def clean_filenames():
-    count = 0
+def clean_filenames(base_path=update_shop.SCRIPT_DIR):
     print("--- Checking for files with spaces ---")
-    
-    # Walk through the current directory and all subfolders
-    for root, dirs, files in os.walk("."):
-        for filename in files:
-            # Check if file has a space
-            if " " in filename:
-                # Check if it is an image file
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in IMAGE_EXTENSIONS:
-                    
-                    # Create the new name (replace space with underscore)
-                    new_filename = filename.replace(" ", "_")
-                    
-                    # Full paths
-                    old_path = os.path.join(root, filename)
-                    new_path = os.path.join(root, new_filename)
-                    
-                    try:
-                        # Rename the file
-                        os.rename(old_path, new_path)
-                        print(f"✅ Fixed: {filename} -> {new_filename}")
-                        count += 1
-                    except OSError as e:
-                        print(f"❌ Error renaming {filename}: {e}")
 
-    if count == 0:
+    # Same scan the build uses: every rename is planned and checked for collisions before any file is touched
+    state = update_shop.new_scan_state(update_shop.load_manifest(base_path), fix_filenames=True)
+    update_shop.scan_directory(base_path, state=state)
+    failed = update_shop.apply_renames(base_path, state)
+    count = len(state["renames"]) - len(failed)
+
+    if count == 0 and not failed and not state["collisions"]:
         print("No files needed fixing. Everything looks good!")
     else:
         print(f"\nSuccessfully renamed {count} files.")
+    return count
 
 if __name__ == "__main__":
-    clean_filenames()
+    parser = argparse.ArgumentParser(description="Replace spaces in image filenames with underscores.")
+    parser.add_argument('--undo', action='store_true', help="put back the names changed by the last run")
+    args = parser.parse_args()
+    if args.undo:
+        update_shop.undo_renames(update_shop.SCRIPT_DIR)
+    else:
+        clean_filenames()
     # Keep window open so user can see what happened
-    input("\nPress Enter to exit...")
\ No newline at end of file
+    input("\nPress Enter to exit...")
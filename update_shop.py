@@ -1,15 +1,154 @@
 import os
+import argparse
 import json
 import re
+import hashlib
+import math
+import time
+from decimal import Decimal, ROUND_HALF_UP
 import subprocess
 import sys
+import select
+import struct
+import ctypes
+import ctypes.util
 import traceback
+import shutil
+import contextlib
+import cProfile
+import threading
+import gzip
+import mimetypes
+import email.utils
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+# Pillow is optional: without it the shop still builds, just without thumbnails
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# brotli is optional too: without it the preview server only offers gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # --- CONFIGURATION ---
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
-IGNORE_LIST = {'.git', 'index.html', 'update_shop.py', 'fix_filenames.py', '.DS_Store', 'node_modules', '__pycache__'}
+IGNORE_LIST = {'.git', 'index.html', 'lot_ids.json', 'update_shop.py', 'fix_filenames.py', 'benchmark_shop.py', '.DS_Store', 'node_modules', '__pycache__', '.shop_cache'}
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Build cache: the manifest remembers each folder's listing so unchanged folders are not re-read.
+# It lives in its own folder so saving it doesn't bump the vault root's mtime.
+CACHE_DIR = '.shop_cache'
+MANIFEST_FILE = os.path.join(CACHE_DIR, 'manifest.json')
+MANIFEST_VERSION = 1
+# What builds changed that hasn't reached GitHub yet; cleared once an upload has been pushed
+PENDING_PUSH_FILE = os.path.join(CACHE_DIR, 'pending_push.json')
+# A folder modified this close to the scan could change again within the same mtime tick (1-2 s on some network
+# shares) without its mtime moving, so its listing is used for this build but not trusted by the next one
+RACY_MTIME_SECONDS = 3
+# Top-level sport folders are scanned in parallel; on a network share stat latency dominates, not CPU
+SCAN_WORKERS = 8
+
+# Generated files (thumbnails etc.) live here; only ignored at the vault root so a sport folder can share the name
+DERIVED_DIR = 'derived'
+INVENTORY_DIR = 'inventory'
+GENERATED_DIRS = {DERIVED_DIR, INVENTORY_DIR}
+
+# Sharded output: only the top level is inlined in index.html, each folder's contents
+# are written to inventory/<id>.json and fetched when a buyer opens it (needs a web server, not file://)
+SHARDED_INVENTORY = False
+
+# Compact output: minified, folder prefixes interned in a string table and nodes stored as
+# arrays instead of objects. unpackInventory() in the page turns it back into the usual tree.
+COMPACT_INVENTORY = False
+INVENTORY_FORMAT_VERSION = 1
+
+# Grid thumbnails: the grid loads these, only the zoom window loads the full scan
+THUMB_WIDTHS = (256, 512, 1024)
+THUMB_QUALITY = 80
+THUMB_WORKERS = None  # None = one process per CPU core
+
+# Placeholders: a BlurHash (https://blurha.sh) of each image goes into its file node, and the card paints it
+# right away while the real image loads. PLACEHOLDER_COMPONENTS is the detail across and down: 2 x 3 suits
+# upright cards and makes a 16 character string, about 5% on top of a compact inventory.
+PLACEHOLDERS = True
+PLACEHOLDER_COMPONENTS = (2, 3)
+PLACEHOLDER_SAMPLE = 32  # Images are shrunk to this many pixels square before encoding
+
+# Derivatives are named after the source's content hash, so renamed/moved scans reuse them.
+# Derivatives whose source is gone are deleted once unused for this many days (least recently used first).
+DERIVED_ORPHAN_DAYS = 7
+
+# Watch mode: rebuild once changes have been quiet for WATCH_DEBOUNCE_SECONDS, push at most every WATCH_PUSH_INTERVAL.
+# inotify is used on Linux; elsewhere (and on network shares, where inotify sees nothing) folders are polled.
+WATCH_DEBOUNCE_SECONDS = 5
+WATCH_POLL_SECONDS = 2
+WATCH_PUSH_INTERVAL = 15 * 60
+
+# Serve mode: preview the shop at http://localhost:SERVE_PORT/, rebuilt in memory when the folders change.
+# Content-hashed URLs (derived/, ?v=) are cached for a year like a CDN would, everything else is revalidated.
+SERVE_PORT = 8000
+SERVE_IMMUTABLE = "public, max-age=31536000, immutable"
+SERVE_REVALIDATE = "no-cache"
+
+# Price is the number at the end of the filename, after a $, _ or space (e.g. Gretzky4_95.jpg, Lot $12.50.jpg)
+PRICE_PATTERN = re.compile(r'[\$_ ]([0-9]+\.?[0-9]*)\.(jpg|jpeg|png|webp|gif)$', re.IGNORECASE)
+# A folder sold as one lot carries its price in the name after a $ (e.g. "Rookie Box $250")
+FOLDER_PRICE_PATTERN = re.compile(r'\$\s*([0-9]+(?:\.[0-9]+)?)')
+PRICE_REPORT_FILE = os.path.join(CACHE_DIR, 'unpriced.txt')
+
+# Search index: words from titles and folder names, plus price ranges for the price filter (in cents)
+TOKEN_PATTERN = re.compile(r'[a-z]+|[0-9]+')
+PRICE_BUCKETS_CENTS = (0, 2500, 5000, 10000, 25000, 50000)
+SEARCH_INDEX_FILE = f"{INVENTORY_DIR}/search.json"
+
+# --optimize: losslessly shrink the originals in place (JPEG through jpegtran when it's installed, PNG through
+# Pillow), dropping EXIF/embedded thumbnails and turning EXIF rotation into real rotation. Colour profiles are
+# kept, so scans look the same afterwards. Images already done are remembered by content hash in the manifest.
+OPTIMIZE_ORIGINALS = False
+OPTIMIZE_WORKERS = None  # None = one process per CPU core
+# jpegtran flags that undo each EXIF orientation; -perfect refuses (rather than trims) images it can't turn exactly
+ORIENTATION_TRANSFORMS = {2: ['-flip', 'horizontal'], 3: ['-rotate', '180'], 4: ['-flip', 'vertical'],
+                          5: ['-transpose'], 6: ['-rotate', '90'], 7: ['-transverse'], 8: ['-rotate', '270']}
+
+# --duplicates: report images that look the same (a 64-bit difference hash per image, cached in the manifest by
+# content hash), e.g. the same cards photographed twice or copied into two folders under different prices
+FIND_DUPLICATES = False
+DUPLICATE_DISTANCE = 6  # Max differing bits out of 64; similar-looking but different cards are usually 15+
+DUPLICATE_REPORT_FILE = os.path.join(CACHE_DIR, 'duplicates.txt')
+
+# Filenames: spaces become underscores (what fix_filenames.py has always done). The renames are planned
+# while the build scans, checked for collisions, then applied as one batch that --undo-renames can reverse.
+FIX_FILENAMES = False
+RENAME_JOURNAL_FILE = os.path.join(CACHE_DIR, 'renames.json')
+
+# --profile: per-phase timings, call counts and output sizes, written here after the run
+PROFILE_FILE = os.path.join(CACHE_DIR, 'profile.json')
+PROFILE_STATS_FILE = os.path.join(CACHE_DIR, 'profile.pstats')  # With --cprofile, open with python -m pstats
+
+# Offline caching: the build writes a service worker next to index.html. Thumbnails (content hash in the
+# path) and originals (content hash in ?v=) are served from the browser's cache without asking the server.
+# Each kind has its own cache and limit, trimmed after every image stored.
+SERVICE_WORKER_FILE = 'sw.js'
+SW_IMAGE_CACHE_LIMIT = 2000  # Most thumbnails the browser keeps; the oldest cached go first
+SW_ORIGINAL_CACHE_LIMIT = 20  # Originals are a few MB each, so only the last few zoomed ones are kept
+ASSET_VERSION_LENGTH = 10  # Hex digits of the content hash in ?v=
+
+# Pre-compressed copies: index.html, sw.js and the inventory JSON also get .gz and .br (needs brotli) siblings
+# at maximum compression, for hosts that serve them as-is. Sizes of every artifact are saved to ARTIFACT_SIZES_FILE.
+PRECOMPRESS_ARTIFACTS = True
+COMPRESS_WORKERS = None  # None = Python's default thread count
+ARTIFACT_SIZES_FILE = os.path.join(CACHE_DIR, 'artifact_sizes.json')
+
+# Lot ids: path -> [id, short content hash] for every lot. Saved next to index.html and uploaded with it rather
+# than kept in the build cache, so ids (and the carts that hold them) survive a fresh clone or a cleared cache.
+LOT_IDS_FILE = 'lot_ids.json'
+
 # --- THE HEADER TEMPLATE ---
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
@@ -19,15 +158,23 @@ HTML_TEMPLATE = """<!DOCTYPE html>
     <title>Captain's Sports Cards</title>
     <!-- Favicon -->
     <link rel="icon" href="data:image/svg+xml,<svg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 100 100%22><text y=%22.9em%22 font-size=%2290%22>🃏</text></svg>">
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
+    <!-- Web fonts load without holding up the first paint; the page shows in system fonts until they arrive -->
+    <link rel="preconnect" href="https://fonts.googleapis.com">
+    <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+    <link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Oswald:wght@400;600;700&family=Roboto:wght@400;500;700&display=swap" media="print" onload="this.media='all'">
+    <!-- Utility classes and icons, compiled at build time (see compile_stylesheet in update_shop.py) -->
+    <style>
+{STYLESHEET_PLACEHOLDER}
+    </style>
     <style>
-        @import url('https://fonts.googleapis.com/css2?family=Oswald:wght@400;600;700&family=Roboto:wght@400;500;700&display=swap');
         body { font-family: 'Roboto', sans-serif; }
         h1, h2, h3, .brand-font { font-family: 'Oswald', sans-serif; }
         .card-lot { transition: all 0.2s ease; }
         .card-lot:hover { transform: translateY(-5px); box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1); }
         .card-lot.selected { border: 4px solid #10B981; opacity: 0.9; transform: scale(0.98); }
+        .card-box { background-size: 100% 100%; }
+        .card-img { transition: opacity 0.3s ease, transform 0.5s cubic-bezier(0.4, 0, 0.2, 1); }
+        .card-img.pending { opacity: 0; }
         .folder-item { transition: all 0.2s ease; cursor: pointer; }
         .folder-item:hover { background-color: #f3f4f6; transform: scale(1.02); }
         
@@ -145,6 +292,16 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 <i class="fa-solid fa-arrow-left mr-2"></i> Back to Previous Folder
             </button>
         </div>
+        <!-- SEARCH -->
+        <div id="search-bar" class="mb-6 flex flex-col sm:flex-row gap-3 hidden">
+            <div class="relative flex-1">
+                <i class="fa-solid fa-magnifying-glass absolute left-3 top-3 text-gray-400"></i>
+                <input id="search-input" type="search" oninput="runSearch()" onfocus="ensureSearchIndex().catch(() => {})" placeholder="Search the whole vault (player, year, set...)" class="w-full pl-10 pr-4 py-2 rounded border border-gray-300 focus:outline-none focus:border-blue-500">
+            </div>
+            <select id="search-price" onchange="runSearch()" class="py-2 px-3 rounded border border-gray-300 bg-white">
+                <option value="">Any Price</option>
+            </select>
+        </div>
         <div id="content-grid" class="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6"></div>
     </main>
 
@@ -152,13 +309,19 @@ HTML_TEMPLATE = """<!DOCTYPE html>
     <script>
         // --- INVENTORY ---
         const inventoryDB = {INVENTORY_PLACEHOLDER};
+        // Search index: inlined object, URL of a JSON file to fetch on first search, or null (no search box)
+        let searchIndex = {SEARCH_PLACEHOLDER};
 
         // --- STATE ---
         let currentPath = [];
         let currentFolder = inventoryDB;
-        const MINIMUM_ORDER = 500.00;
-        let currentTotal = 0.00;
-        let selectedLots = new Set();
+        // Prices are whole cents (parsed at build time), so totals never drift
+        const MINIMUM_ORDER_CENTS = 50000;
+        let currentTotalCents = 0;
+        // Cart: lot id -> price in cents. Ids come from the build and stay the same when a scan is renamed or moved,
+        // so the cart is kept in localStorage and survives reloads and reorganized folders.
+        const CART_STORAGE_KEY = 'cart';
+        let selectedLots = new Map();
 
         // Zoom State
         let isDragging = false;
@@ -167,13 +330,75 @@ HTML_TEMPLATE = """<!DOCTYPE html>
         let isZoomed = false;
 
         // --- FUNCTIONS ---
-        function getPriceFromFilename(filename) {
-            const match = filename.match(/[\$_ ]([0-9]+\.?[0-9]*)\.(jpg|jpeg|png|webp|gif)$/i);
-            return (match && match[1]) ? parseFloat(match[1]) : 0.00;
+        function encodePath(path) {
+            return path.split('/').map(encodeURIComponent).join('/');
+        }
+
+        // BlurHash placeholders (see blurhash() in update_shop.py): decoded once per hash into a tiny PNG,
+        // which the browser smooths out when it stretches it over the card
+        const BLURHASH_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+        const PLACEHOLDER_PIXELS = 8;
+        const placeholderUrls = new Map();
+        function decode83(text) {
+            let value = 0;
+            for (const c of text) value = value * 83 + BLURHASH_DIGITS.indexOf(c);
+            return value;
+        }
+        function srgbToLinear(value) {
+            const v = value / 255;
+            return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+        }
+        function linearToSrgb(value) {
+            const v = Math.max(0, Math.min(1, value));
+            return Math.round(v <= 0.0031308 ? v * 12.92 * 255 : (1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+        }
+        function placeholderUrl(hash) {
+            if (placeholderUrls.has(hash)) return placeholderUrls.get(hash);
+            const sizeFlag = decode83(hash[0]);
+            const columns = sizeFlag % 9 + 1, rows = Math.floor(sizeFlag / 9) + 1;
+            const maximum = (decode83(hash[1]) + 1) / 166;
+            const dc = decode83(hash.slice(2, 6));
+            const colors = [[srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]];
+            for (let i = 1; i < columns * rows; i++) {
+                const value = decode83(hash.slice(4 + i * 2, 6 + i * 2));
+                colors.push([Math.floor(value / 361), Math.floor(value / 19) % 19, value % 19].map(q => {
+                    const v = (q - 9) / 9;
+                    return Math.sign(v) * v * v * maximum;
+                }));
+            }
+            const size = PLACEHOLDER_PIXELS;
+            const canvas = document.createElement('canvas');
+            canvas.width = canvas.height = size;
+            const ctx = canvas.getContext('2d');
+            const image = ctx.createImageData(size, size);
+            for (let y = 0; y < size; y++) {
+                for (let x = 0; x < size; x++) {
+                    const pixel = [0, 0, 0];
+                    for (let j = 0; j < rows; j++) {
+                        for (let i = 0; i < columns; i++) {
+                            const basis = Math.cos(Math.PI * i * x / size) * Math.cos(Math.PI * j * y / size);
+                            colors[i + j * columns].forEach((c, k) => pixel[k] += c * basis);
+                        }
+                    }
+                    image.data.set([...pixel.map(linearToSrgb), 255], (y * size + x) * 4);
+                }
+            }
+            ctx.putImageData(image, 0, 0);
+            const url = canvas.toDataURL();
+            placeholderUrls.set(hash, url);
+            return url;
+        }
+
+        function formatCents(cents) {
+            return '$' + (cents / 100).toFixed(2);
         }
 
-        function openZoom(src) {
+        function openZoom(src, width, height) {
             const img = document.getElementById('zoom-img');
+            // Size the image to its fitted box before it loads (same fit as the max-width/max-height rules)
+            const fit = width ? Math.min(1, window.innerWidth * 0.9 / width, window.innerHeight * 0.9 / height) : 0;
+            img.style.width = fit ? `${Math.round(width * fit)}px` : '';
+            img.style.height = fit ? `${Math.round(height * fit)}px` : '';
             img.src = src;
             // Reset zoom state
             scale = 1;
@@ -292,6 +517,71 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             }
         }
 
+        // Lot id -> {card, item} for the cards on screen, so cart changes patch one card instead of re-rendering
+        const shownLots = new Map();
+
+        function applySelection(card, isSelected) {
+            card.classList.toggle('selected', isSelected);
+            const btn = card.querySelector('.cart-btn');
+            btn.className = `cart-btn mt-4 w-full ${isSelected ? 'bg-red-500 hover:bg-red-600' : 'bg-blue-600 hover:bg-blue-700'} text-white text-center py-2 rounded font-bold transition shadow-sm cursor-pointer select-none`;
+            btn.innerHTML = isSelected ? '<i class="fa-solid fa-trash mr-1"></i> Remove' : '<i class="fa-solid fa-cart-plus mr-1"></i> Add to Cart';
+        }
+
+        function createCard(item) {
+            const priceCents = item.price_cents || 0;
+            const card = document.createElement('div');
+            card.className = 'card-lot bg-white rounded-lg shadow overflow-hidden relative';
+            
+            // Grid shows a thumbnail when the build made one; the zoom window always opens the original
+            // (search results only carry the smallest thumbnail, no srcset)
+            const imgSrc = item.thumb
+                ? `src="${encodePath(item.thumb)}"` + (item.srcset ? ` srcset="${item.srcset.map(([path, width]) => `${encodePath(path)} ${width}w`).join(', ')}" sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, (min-width: 640px) 50vw, 100vw"` : '')
+                : `src="${originalUrl(item)}"`;
+            // With the size known the box takes the image's shape before it loads: no layout shift, no cropping
+            const width = item.width || 0, height = item.height || 0;
+            // The blurred placeholder is the box's background; the image fades in over it once it has loaded
+            const boxStyle = [width ? `aspect-ratio: ${width} / ${height}` : '', item.blurhash ? `background-image: url(${placeholderUrl(item.blurhash)})` : ''].filter(Boolean).join('; ');
+            const sizeAttrs = width ? `width="${width}" height="${height}"` : '';
+            const pending = item.blurhash ? ' pending' : '';
+
+            card.innerHTML = `
+                <div class="card-box ${width ? '' : 'h-64 '}bg-slate-200 flex items-center justify-center text-slate-400 relative overflow-hidden group" style="${boxStyle}">
+                    <img ${imgSrc} ${sizeAttrs} loading="lazy" class="card-img${pending} w-full h-full object-cover group-hover:scale-110 cursor-pointer" onload="this.classList.remove('pending')" onclick="zoomLot(${item.id})" onerror="this.parentElement.style.backgroundImage=''; this.parentElement.innerHTML='<i class=\\'fa-solid fa-image text-4xl\\'></i><span class=\\'ml-2\\'>Image not found</span>'">
+                    
+                    <!-- Zoom Icon Overlay -->
+                    <div class="absolute top-2 right-2 bg-black bg-opacity-60 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition-opacity cursor-pointer pointer-events-none">
+                        <i class="fa-solid fa-magnifying-glass-plus text-xl"></i>
+                    </div>
+                </div>
+                <div class="p-4">
+                    <div class="flex justify-between items-start mb-2">
+                        <h3 class="font-bold text-lg text-slate-800 leading-tight truncate pr-2" title="${item.title}">${item.title}</h3>
+                        <span class="bg-green-100 text-green-800 text-lg font-bold px-2 py-1 rounded whitespace-nowrap">${formatCents(priceCents)}</span>
+                    </div>
+                    <!-- Button handles selection separately -->
+                    <div class="cart-btn" onclick="toggleSelection(${item.id})"></div>
+                </div>`;
+            card.dataset.lot = item.id;
+            if (selectedLots.has(item.id) && selectedLots.get(item.id) !== priceCents) {
+                // Repriced since it went into the cart
+                selectedLots.set(item.id, priceCents);
+                saveCart();
+            }
+            applySelection(card, selectedLots.has(item.id));
+            shownLots.set(item.id, { card, item });
+            return card;
+        }
+
+        function originalUrl(item) {
+            // ?v= is the image's content hash: a re-photographed lot gets a new URL, so caches never show the old one
+            return encodePath(item.name) + (item.version ? `?v=${item.version}` : '');
+        }
+
+        function zoomLot(id) {
+            const item = shownLots.get(id).item;
+            openZoom(originalUrl(item), item.width || 0, item.height || 0);
+        }
+
         function render() {
             const grid = document.getElementById('content-grid');
             const breadcrumbs = document.getElementById('breadcrumbs');
@@ -299,6 +589,12 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             
             grid.innerHTML = '';
             breadcrumbs.innerHTML = '';
+            shownLots.clear();
+
+            if (activeSearch) {
+                renderSearchResults(grid, breadcrumbs, backBtn);
+                return;
+            }
 
             // Breadcrumbs
             if (currentPath.length === 0) {
@@ -332,78 +628,293 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             sortedContents.forEach(item => {
                 if (item.type === 'folder') {
                     const folderEl = document.createElement('div');
-                    folderEl.className = 'folder-item bg-white p-6 rounded-lg shadow border border-gray-200 flex flex-col items-center justify-center text-center h-48';
+                    folderEl.className = 'folder-item bg-white p-6 rounded-lg shadow border border-gray-200 flex flex-col items-center justify-center text-center min-h-[12rem]';
                     folderEl.onclick = () => openFolder(item);
                     
                     const totalFiles = item.total_files || 0;
                     const totalFolders = item.total_folders || 0;
+                    // Totals come precomputed from the build, nothing here walks the folder's contents
+                    const priceRange = item.min_price_cents == null ? ''
+                        : item.min_price_cents === item.max_price_cents ? formatCents(item.min_price_cents)
+                        : `${formatCents(item.min_price_cents)} - ${formatCents(item.max_price_cents)}`;
                     
                     folderEl.innerHTML = `<i class="fa-solid fa-folder text-6xl text-yellow-500 mb-4"></i><h3 class="text-xl font-bold text-slate-800 truncate w-full" title="${item.name}">${item.name}</h3>
+                    ${item.lot_price_cents != null ? `<span class="bg-green-100 text-green-800 text-sm font-bold px-2 py-1 rounded mt-1">Lot Price ${formatCents(item.lot_price_cents)}</span>` : ''}
                     <p class="text-xs text-gray-500 mt-2 font-mono bg-gray-100 rounded px-2 py-1 inline-block">
                         <i class="fa-solid fa-layer-group mr-1"></i>${totalFiles} Files / ${totalFolders} Folders
-                    </p>`;
+                    </p>
+                    ${priceRange ? `<p class="text-xs text-gray-500 mt-1 font-mono">Value ${formatCents(item.total_value_cents)} &middot; ${priceRange}</p>` : ''}`;
                     grid.appendChild(folderEl);
                 } else {
-                    const price = getPriceFromFilename(item.name);
-                    const isSelected = selectedLots.has(item.name);
-                    const card = document.createElement('div');
-                    card.className = `card-lot bg-white rounded-lg shadow overflow-hidden relative ${isSelected ? 'selected' : ''}`;
-                    
-                    const encodedPath = item.name.split('/').map(encodeURIComponent).join('/');
-                    
-                    const btnColor = isSelected ? 'bg-red-500 hover:bg-red-600' : 'bg-blue-600 hover:bg-blue-700';
-                    const btnText = isSelected ? '<i class="fa-solid fa-trash mr-1"></i> Remove' : '<i class="fa-solid fa-cart-plus mr-1"></i> Add to Cart';
-
-                    card.innerHTML = `
-                        <div class="h-64 bg-slate-200 flex items-center justify-center text-slate-400 relative overflow-hidden group">
-                            <img src="${encodedPath}" loading="lazy" class="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110 cursor-pointer" onclick="openZoom('${encodedPath}')" onerror="this.parentElement.innerHTML='<i class=\\'fa-solid fa-image text-4xl\\'></i><span class=\\'ml-2\\'>Image not found</span>'">
-                            
-                            <!-- Zoom Icon Overlay -->
-                            <div class="absolute top-2 right-2 bg-black bg-opacity-60 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition-opacity cursor-pointer pointer-events-none">
-                                <i class="fa-solid fa-magnifying-glass-plus text-xl"></i>
-                            </div>
-                        </div>
-                        <div class="p-4">
-                            <div class="flex justify-between items-start mb-2">
-                                <h3 class="font-bold text-lg text-slate-800 leading-tight truncate pr-2" title="${item.title}">${item.title}</h3>
-                                <span class="bg-green-100 text-green-800 text-lg font-bold px-2 py-1 rounded whitespace-nowrap">$${price.toFixed(2)}</span>
-                            </div>
-                            <!-- Button handles selection separately -->
-                            <div class="mt-4 w-full ${btnColor} text-white text-center py-2 rounded font-bold transition shadow-sm cursor-pointer select-none" onclick="toggleSelection('${item.name}', ${price})">${btnText}</div>
-                        </div>`;
-                    grid.appendChild(card);
+                    grid.appendChild(createCard(item));
                 }
             });
         }
 
-        function openFolder(folderObj) { 
+        // --- SEARCH ---
+        // Index built with the inventory (see build_search_index in update_shop.py), lots numbered depth-first:
+        // {f: folders [parentNumber, name, firstLot, lotCount], d: lots [folderNumber, position in its contents, lotId],
+        // t: token -> sorted lot numbers, ft: token -> folder numbers, b: price buckets [fromCents, toCents, lot numbers]}
+        const SEARCH_LIMIT = 120;
+        let activeSearch = null;
+        let searchTokens = [];
+        let searchFolders = new Map();
+
+        function setSearchIndex(index) {
+            searchIndex = index;
+            searchTokens = [...new Set([...Object.keys(index.t), ...Object.keys(index.ft)])].sort();
+            searchFolders = new Map();
+            const select = document.getElementById('search-price');
+            index.b.forEach(([from, to], i) => {
+                const option = document.createElement('option');
+                option.value = i;
+                option.textContent = to == null ? `${formatCents(from)}+` : `${formatCents(from)} - ${formatCents(to)}`;
+                select.appendChild(option);
+            });
+        }
+
+        // The index is its own file, fetched once when the search box is first used
+        let searchIndexLoading = null;
+        function ensureSearchIndex() {
+            if (typeof searchIndex !== 'string') return Promise.resolve();
+            if (!searchIndexLoading) {
+                searchIndexLoading = fetch(searchIndex).then(response => {
+                    if (!response.ok) throw new Error(`${response.status} ${response.statusText}`);
+                    return response.json();
+                }).then(setSearchIndex).catch(error => { searchIndexLoading = null; throw error; });
+            }
+            return searchIndexLoading;
+        }
+
+        function tokenize(text) {
+            return text.toLowerCase().match(/[a-z]+|[0-9]+/g) || [];
+        }
+
+        // Every lot under the given folders: each folder's lots are one range, nested folders fall inside their parent's
+        function expandFolders(folderNumbers) {
+            const ranges = folderNumbers.map(number => [searchIndex.f[number][2], searchIndex.f[number][2] + searchIndex.f[number][3]]).sort((a, b) => a[0] - b[0]);
+            const lots = [];
+            let end = 0;
+            ranges.forEach(([from, to]) => {
+                for (let lot = Math.max(from, end); lot < to; lot++) lots.push(lot);
+                end = Math.max(end, to);
+            });
+            return lots;
+        }
+
+        // Lots for one query word: titles containing it, plus everything in folders named with it.
+        // The last word also matches as a prefix since it may still be being typed.
+        function postingsFor(token, isPrefix) {
+            let tokens = [token];
+            if (isPrefix) {
+                let lo = 0, hi = searchTokens.length;
+                while (lo < hi) {
+                    const mid = (lo + hi) >> 1;
+                    if (searchTokens[mid] < token) lo = mid + 1; else hi = mid;
+                }
+                tokens = [];
+                for (let i = lo; i < searchTokens.length && searchTokens[i].startsWith(token); i++) tokens.push(searchTokens[i]);
+            }
+            const lists = tokens.map(t => searchIndex.t[t]).filter(Boolean);
+            const folders = tokens.flatMap(t => searchIndex.ft[t] || []);
+            if (folders.length) lists.push(expandFolders(folders));
+            if (lists.length <= 1) return lists[0] || [];
+            return [...new Set(lists.flat())].sort((a, b) => a - b);
+        }
+
+        // Folder node for a folder number, loading shards on the way down in sharded builds
+        function searchFolder(number) {
+            if (!searchFolders.has(number)) {
+                const [parent, name] = searchIndex.f[number];
+                searchFolders.set(number, parent === -1 ? Promise.resolve(inventoryDB) : searchFolder(parent).then(async folder => {
+                    if (!folder) return undefined;
+                    await loadFolder(folder);
+                    return folder.contents.find(item => item.type === 'folder' && item.name === name);
+                }));
+            }
+            return searchFolders.get(number);
+        }
+
+        // File node for a lot number, or undefined if the inventory no longer has it
+        async function searchLot(number) {
+            const [folderNumber, position] = searchIndex.d[number];
+            const folder = await searchFolder(folderNumber);
+            if (!folder) return undefined;
+            await loadFolder(folder);
+            return folder.contents[position];
+        }
+
+        function containsSorted(list, value) {
+            let lo = 0, hi = list.length;
+            while (lo < hi) {
+                const mid = (lo + hi) >> 1;
+                if (list[mid] < value) lo = mid + 1; else hi = mid;
+            }
+            return lo < list.length && list[lo] === value;
+        }
+
+        // Walk the shortest posting list and binary-search the others, so the cost follows the matches, not the vault
+        function intersectSorted(lists) {
+            lists.sort((a, b) => a.length - b.length);
+            return lists[0].filter(id => lists.slice(1).every(list => containsSorted(list, id)));
+        }
+
+        async function runSearch() {
+            const query = document.getElementById('search-input').value;
+            const bucket = document.getElementById('search-price').value;
+            const words = tokenize(query);
+            if (words.length === 0 && bucket === '') {
+                if (activeSearch) { activeSearch = null; render(); }
+                return;
+            }
+            try {
+                await ensureSearchIndex();
+            } catch (error) {
+                alert(`Could not load the search index: ${error.message}`);
+                return;
+            }
+            const lists = words.map((word, i) => postingsFor(word, i === words.length - 1 && !/\s$/.test(query)));
+            if (bucket !== '') lists.push(searchIndex.b[bucket][2]);
+            const ids = intersectSorted(lists);
+            let lots;
+            try {
+                lots = (await Promise.all(ids.slice(0, SEARCH_LIMIT).map(searchLot))).filter(Boolean);
+            } catch (error) {
+                alert(`Could not load the search results: ${error.message}`);
+                return;
+            }
+            activeSearch = { query, total: ids.length, lots };
+            render();
+        }
+
+        function clearSearch() {
+            activeSearch = null;
+            document.getElementById('search-input').value = '';
+            document.getElementById('search-price').value = '';
+        }
+
+        function renderSearchResults(grid, breadcrumbs, backBtn) {
+            const shown = activeSearch.lots.length;
+            breadcrumbs.innerHTML = `<span class="text-slate-900 font-bold">Search Results</span> <span class="text-gray-500">(${activeSearch.total === shown ? shown : `first ${shown} of ${activeSearch.total}`} lots)</span>`;
+            backBtn.classList.remove('hidden');
+            if (shown === 0) {
+                grid.innerHTML = `<div class="col-span-full text-center py-12 text-gray-400"><i class="fa-solid fa-magnifying-glass text-6xl mb-4"></i><p>No lots match your search.</p></div>`;
+                return;
+            }
+            activeSearch.lots.forEach(item => grid.appendChild(createCard(item)));
+        }
+
+        // Compact builds: {p: folder prefixes, f: folder keys, i: file keys, c: rows}.
+        // Folder rows are [name, childRows, ...values], file rows are [prefixIndex, fileName, ...values].
+        function unpackInventory(packed) {
+            const unpackRows = rows => rows.map(row => {
+                const isFolder = typeof row[0] === 'string';
+                const node = isFolder
+                    ? { name: row[0], type: 'folder' }
+                    : { name: packed.p[row[0]] + row[1], type: 'file', title: row[1].replace(/\.[^.]*$/, '') };
+                if (isFolder && row[1]) node.contents = unpackRows(row[1]);
+                (isFolder ? packed.f : packed.i).forEach((key, i) => {
+                    if (row[i + 2] != null) node[key] = row[i + 2];
+                });
+                return node;
+            });
+            return unpackRows(packed.c);
+        }
+
+        // Sharded builds leave "contents" out of folders and point at a JSON shard instead
+        const shardCache = new Map();
+        function loadFolder(folderObj) {
+            if (folderObj.contents || !folderObj.shard) return Promise.resolve();
+            if (!shardCache.has(folderObj.shard)) {
+                shardCache.set(folderObj.shard, fetch(folderObj.shard).then(response => {
+                    if (!response.ok) throw new Error(`${response.status} ${response.statusText}`);
+                    return response.json();
+                }).catch(error => { shardCache.delete(folderObj.shard); throw error; }));
+            }
+            return shardCache.get(folderObj.shard).then(data => {
+                folderObj.contents = Array.isArray(data) ? data : unpackInventory(data);
+            });
+        }
+
+        async function openFolder(folderObj) { 
+            try {
+                await loadFolder(folderObj);
+            } catch (error) {
+                alert(`Could not load "${folderObj.name}": ${error.message}`);
+                return;
+            }
+            clearSearch();
             currentPath.push(currentFolder); 
             currentFolder = folderObj; 
             render(); 
             // Removed: window.scrollTo(0, 0); 
         }
-        function goUpLevel() { if (currentPath.length > 0) { currentFolder = currentPath.pop(); render(); } }
+        function goUpLevel() {
+            if (activeSearch) { clearSearch(); render(); return; }  // "Back" from search results returns to the folder
+            if (currentPath.length > 0) { currentFolder = currentPath.pop(); render(); }
+        }
         function goHome() { 
+            clearSearch();
             currentPath = []; 
             currentFolder = inventoryDB; 
             render(); 
         }
         function navigateToBreadcrumb(index) { currentFolder = currentPath[index]; currentPath = currentPath.slice(0, index); render(); }
 
-        function toggleSelection(filename, price) {
-            if (selectedLots.has(filename)) { selectedLots.delete(filename); currentTotal -= price; } 
-            else { selectedLots.add(filename); currentTotal += price; }
-            render(); updateTotalDisplay();
+        function toggleSelection(id) {
+            const { card, item } = shownLots.get(id);
+            if (selectedLots.has(id)) selectedLots.delete(id);
+            else selectedLots.set(id, item.price_cents || 0);
+            // Only the clicked card changes; full re-renders are for navigation
+            applySelection(card, selectedLots.has(id));
+            saveCart();
+        }
+
+        function saveCart() {
+            try {
+                localStorage.setItem(CART_STORAGE_KEY, JSON.stringify([...selectedLots]));
+            } catch (e) {}  // Storage can be off (private browsing); the cart then lasts until the page closes
+            updateTotalDisplay();
+        }
+
+        function loadCart() {
+            try {
+                selectedLots = new Map(JSON.parse(localStorage.getItem(CART_STORAGE_KEY)) || []);
+            } catch (e) {
+                selectedLots = new Map();
+            }
+            updateTotalDisplay();
+        }
+
+        // A saved cart can outlive its lots (sold, or removed from the shop): drop ids the current inventory no
+        // longer has and pick up today's prices. Needs the search index; offline or on file:// the cart is kept as saved.
+        async function checkCart() {
+            if (!selectedLots.size || !searchIndex) return;
+            let lots;
+            try {
+                await ensureSearchIndex();
+                const numbers = new Map(searchIndex.d.map((doc, number) => [doc[2], number]));
+                lots = await Promise.all([...selectedLots.keys()].map(async id => [id, numbers.has(id) ? await searchLot(numbers.get(id)) : undefined]));
+            } catch (e) {
+                return;
+            }
+            lots.forEach(([id, item]) => {
+                if (!selectedLots.has(id)) return;  // Unselected while the index was loading
+                if (item && item.id === id) selectedLots.set(id, item.price_cents || 0);
+                else selectedLots.delete(id);
+            });
+            saveCart();
         }
 
         function updateTotalDisplay() {
-            currentTotal = Math.max(0, Math.round(currentTotal * 100) / 100);
-            document.getElementById('display-total').textContent = '$' + currentTotal.toFixed(2);
+            currentTotalCents = 0;
+            selectedLots.forEach(priceCents => currentTotalCents += priceCents);
+            document.getElementById('display-total').textContent = formatCents(currentTotalCents);
             const btn = document.getElementById('checkout-btn');
-            if (currentTotal >= MINIMUM_ORDER) {
+            if (currentTotalCents >= MINIMUM_ORDER_CENTS) {
                 btn.disabled = false;
                 btn.className = "bg-green-600 hover:bg-green-700 cursor-pointer shadow-lg text-white font-bold py-2 px-6 rounded transition-colors text-sm sm:text-base";
-                btn.innerText = `CHECKOUT ($${currentTotal.toFixed(2)})`;
+                btn.innerText = `CHECKOUT (${formatCents(currentTotalCents)})`;
             } else {
                 btn.disabled = true;
                 btn.className = "bg-gray-600 text-gray-300 font-bold py-2 px-6 rounded opacity-50 cursor-not-allowed transition-colors text-sm sm:text-base";
@@ -412,113 +923,2265 @@ HTML_TEMPLATE = """<!DOCTYPE html>
         }
 
         function processCheckout() {
-            if (currentTotal >= MINIMUM_ORDER) {
+            if (currentTotalCents >= MINIMUM_ORDER_CENTS) {
                 const lotCount = selectedLots.size;
-                alert(`Proceeding to checkout!\\n\\nLots Selected: ${lotCount}\\nTotal: $${currentTotal.toFixed(2)}`);
+                alert(`Proceeding to checkout!\\n\\nLots Selected: ${lotCount}\\nTotal: ${formatCents(currentTotalCents)}`);
             }
         }
+        if (searchIndex) {
+            if (typeof searchIndex === 'object') setSearchIndex(searchIndex);
+            document.getElementById('search-bar').classList.remove('hidden');
+        }
+        loadCart();
         render();
+        checkCart();
+
+        // Offline support and image caching (see SW_TEMPLATE); service workers only run on http(s)
+        if ('serviceWorker' in navigator && location.protocol.startsWith('http')) {
+            navigator.serviceWorker.register('{SERVICE_WORKER_FILE}');
+        }
     </script>
 </body>
 </html>
 """
 
-def scan_directory(base_path, relative_path=""):
-    contents = []
-    total_files = 0
-    total_folders = 0
-    
+# --- THE SERVICE WORKER TEMPLATE ---
+# {SHELL_VERSION} is a hash of index.html, so every new build is a new worker that re-caches the page
+SW_TEMPLATE = """const SHELL_CACHE = 'shell-{SHELL_VERSION}';
+const IMAGE_CACHE = 'images';
+const IMAGE_CACHE_LIMIT = {IMAGE_CACHE_LIMIT};
+const ORIGINAL_CACHE = 'originals';
+const ORIGINAL_CACHE_LIMIT = {ORIGINAL_CACHE_LIMIT};
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(SHELL_CACHE).then(cache => cache.addAll(['./'])).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(keys => Promise.all(keys.filter(key => key.startsWith('shell-') && key !== SHELL_CACHE).map(key => caches.delete(key))))
+        .then(() => Promise.all([trimCache(IMAGE_CACHE, IMAGE_CACHE_LIMIT), trimCache(ORIGINAL_CACHE, ORIGINAL_CACHE_LIMIT)]))
+        .then(() => self.clients.claim()));
+});
+
+// Thumbnails have the content hash in their path and originals carry it in ?v=, so a cached copy is never stale
+function isHashed(url) {
+    return url.pathname.includes('/derived/') || url.searchParams.has('v');
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== location.origin) return;
+    // Page, inventory shards and search index: network first so new prices show at once, cached copy when offline
+    if (!isHashed(url)) event.respondWith(networkFirst(request));
+    else if (url.pathname.includes('/derived/')) event.respondWith(cacheFirst(event, IMAGE_CACHE, IMAGE_CACHE_LIMIT));
+    else event.respondWith(cacheFirst(event, ORIGINAL_CACHE, ORIGINAL_CACHE_LIMIT));
+});
+
+async function cacheFirst(event, cacheName, limit) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(event.request);
+    if (cached) return cached;
+    const response = await fetch(event.request);
+    // The image goes back to the page at once; storing it and trimming happen after, and a failed store
+    // (storage full) only means it is fetched again next time. Only whole responses: cache.put rejects a 206.
+    if (response.status === 200) event.waitUntil(storeImage(cache, cacheName, limit, event.request, response.clone()));
+    return response;
+}
+
+async function storeImage(cache, cacheName, limit, request, response) {
+    try {
+        await cache.put(request, response);
+    } catch (error) {
+        // Out of space: make room for the next ones
+        return trimCache(cacheName, Math.floor(limit / 2));
+    }
+    return trimCache(cacheName, limit);
+}
+
+async function trimCache(cacheName, limit) {
+    // Keys come back oldest first. Counted on every store, since the worker can be stopped whenever it is idle.
+    try {
+        const cache = await caches.open(cacheName);
+        const keys = await cache.keys();
+        await Promise.all(keys.slice(0, Math.max(0, keys.length - limit)).map(key => cache.delete(key)));
+    } catch (error) {}
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    try {
+        const response = await fetch(request);
+        if (response.ok) cache.put(request, response.clone()).catch(() => {});  // Storage full: still served, just not offline
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) return cached;
+        throw error;
+    }
+}
+"""
+
+def load_manifest(base_path):
+    try:
+        with open(os.path.join(base_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "dirs": {}}
+
+def write_if_changed(base_path, rel_path, text, changes=None):
+    # Every generated file goes through here: if the existing file already has this content, nothing is
+    # touched (no mtime bump, no git diff). Otherwise write a temp file and swap it in with os.replace, so a
+    # crash never leaves a half-written file. Returns True if the file was written.
+    if changes is not None and "memory" in changes:
+        # Serve mode: the file is kept in memory and the folder on disk is left as it is
+        changes["memory"][rel_path.replace("\\", "/")] = text.encode('utf-8')
+        return True
+    path = os.path.join(base_path, rel_path)
+    data = text.replace("\n", os.linesep).encode('utf-8')  # Same bytes open(..., 'w') would have written
+    try:
+        with open(path, 'rb') as f:
+            if hashlib.blake2b(f.read()).digest() == hashlib.blake2b(data).digest():
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or base_path, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    if changes is not None:
+        changes["outputs"].add(rel_path.replace("\\", "/"))
+    return True
+
+def save_manifest(base_path, manifest):
+    write_if_changed(base_path, MANIFEST_FILE, json.dumps(manifest, separators=(',', ':')))
+
+def new_scan_state(manifest, dirty=None, fix_filenames=False):
+    # dirty: folders known to have changed (from watch mode); the rest are trusted without a stat. None = check all.
+    # fix_filenames: plan renames into "renames" as (old, new) web paths, clashes go to "collisions"
+    return {"old_dirs": manifest.get("dirs", {}), "dirty": dirty, "dirs": {}, "rescanned": 0, "unpriced": [], "lots": [],
+            "renames": [] if fix_filenames else None, "collisions": [], "started": time.time_ns()}
+
+def fork_scan_state(state):
+    # Each worker thread gets its own state so nothing is shared while scanning
+    if state is None: return None
+    return {"old_dirs": state["old_dirs"], "dirty": state["dirty"], "dirs": {}, "rescanned": 0, "unpriced": [], "lots": [],
+            "renames": None if state["renames"] is None else [], "collisions": [], "started": state["started"]}
+
+def merge_scan_state(state, child):
+    if state is None: return
+    state["dirs"].update(child["dirs"])
+    state["rescanned"] += child["rescanned"]
+    state["unpriced"].extend(child["unpriced"])
+    state["lots"].extend(child["lots"])
+    if state["renames"] is not None:
+        state["renames"].extend(child["renames"])
+    state["collisions"].extend(child["collisions"])
+
+def tokenize(text):
+    # Letters and digits split apart, so "Gretzky4_95" finds "gretzky", "4" and "95" (same as tokenize() in the page)
+    return TOKEN_PATTERN.findall(text.lower())
+
+def to_cents(amount):
+    # Whole cents via Decimal, so "12.5" and "12.50" both give 1250 with no float rounding
+    return int((Decimal(amount) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def format_cents(price_cents):
+    return "no price" if price_cents is None else f"${price_cents // 100:,}.{price_cents % 100:02d}"
+
+def parse_price_cents(filename):
+    match = PRICE_PATTERN.search(filename)
+    return to_cents(match.group(1)) if match else None
+
+def parse_folder_price_cents(folder_name):
+    match = FOLDER_PRICE_PATTERN.search(folder_name)
+    return to_cents(match.group(1)) if match else None
+
+def new_totals():
+    return {"total_files": 0, "total_folders": 0, "total_value_cents": 0}
+
+def add_price(totals, price_cents):
+    totals["total_value_cents"] += price_cents
+    totals["min_price_cents"] = min(totals.get("min_price_cents", price_cents), price_cents)
+    totals["max_price_cents"] = max(totals.get("max_price_cents", price_cents), price_cents)
+
+def list_directory(base_path, relative_path, state):
+    # Returns the manifest entry for one folder: its subfolders and image files.
+    # A folder's mtime only changes when entries are added, removed or renamed,
+    # so if it (and its inode) match the manifest we can skip reading it again.
     current_scan_path = os.path.join(base_path, relative_path)
+    key = relative_path.replace("\\", "/")
+    cached = state["old_dirs"].get(key) if state else None
+    if cached and cached["mtime"] is None: cached = None  # Racy listing from the last scan, see RACY_MTIME_SECONDS
+    if cached and state["dirty"] is not None and key not in state["dirty"]:
+        state["dirs"][key] = cached
+        return cached
+
     try:
-        items = os.listdir(current_scan_path)
+        st = os.stat(current_scan_path)
     except OSError:
-        return [], 0, 0
-    items.sort()
+        return None
+
+    if cached and cached["mtime"] == st.st_mtime_ns and cached["ino"] == st.st_ino:
+        entry = cached
+    else:
+        # scandir hands back the file type with each entry, so no extra isdir/isfile stat per item
+        dirs, files = [], []
+        try:
+            with os.scandir(current_scan_path) as it:
+                for item in it:
+                    if item.name in IGNORE_LIST: continue
+                    if not relative_path and item.name in GENERATED_DIRS: continue
+                    if item.is_dir():
+                        dirs.append(item.name)
+                    elif item.is_file():
+                        ext = os.path.splitext(item.name)[1].lower()
+                        if ext in IMAGE_EXTENSIONS:
+                            files.append(item.name)
+        except OSError:
+            return None
+        dirs.sort()
+        files.sort()
+        racy = state and st.st_mtime_ns > state["started"] - RACY_MTIME_SECONDS * 10**9
+        entry = {"mtime": None if racy else st.st_mtime_ns, "ino": st.st_ino, "dirs": dirs, "files": files}
+        if state: state["rescanned"] += 1
+
+    if state: state["dirs"][key] = entry
+    return entry
+
+def normalized_filename(filename):
+    return filename.replace(" ", "_")
+
+def plan_renames(relative_path, files, state):
+    # Returns the folder's image names as they will be once the planned renames are applied.
+    # Names are compared case-insensitively, since "A_1.jpg" and "a_1.jpg" are the same file on Windows.
+    taken = {name.casefold() for name in files}
+    prefix = relative_path.replace("\\", "/") + "/" if relative_path else ""
+    planned = []
+    for name in files:
+        new_name = normalized_filename(name)
+        if new_name != name:
+            if new_name.casefold() in taken:
+                state["collisions"].append((prefix + name, prefix + new_name))
+                new_name = name
+            else:
+                taken.add(new_name.casefold())
+                state["renames"].append((prefix + name, prefix + new_name))
+        planned.append(new_name)
+    return planned
+
+def load_rename_journal(base_path):
+    try:
+        with open(os.path.join(base_path, RENAME_JOURNAL_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"batches": []}
+
+def apply_renames(base_path, state):
+    # Applies the renames planned by the scan. The batch is journaled before anything is renamed, so it can be
+    # undone (even after a crash halfway through). Returns the renames that failed, as {new web path: old web path}.
+    for old_path, new_path in state["collisions"]:
+        print(f"⚠️ Not renaming {old_path}: {new_path.rpartition('/')[2]} already exists")
+    if not state["renames"]:
+        return {}
+    journal = load_rename_journal(base_path)
+    journal["batches"].append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "renames": state["renames"]})
+    write_if_changed(base_path, RENAME_JOURNAL_FILE, json.dumps(journal, indent=4))
+
+    failed = {}
+    for old_path, new_path in state["renames"]:
+        old_full, new_full = os.path.join(base_path, old_path), os.path.join(base_path, new_path)
+        try:
+            if os.path.exists(new_full):  # Appeared since the scan; os.rename would overwrite it on Linux/Mac
+                raise FileExistsError(f"{new_path} already exists")
+            os.rename(old_full, new_full)
+            print(f"✅ Fixed: {old_path} -> {new_path.rpartition('/')[2]}")
+        except OSError as e:
+            print(f"❌ Error renaming {old_path}: {e}")
+            failed[new_path] = old_path
+
+    # The scan already built this run's nodes with the new names, put the old ones back where a rename failed
+    for node in state["lots"]:
+        old_path = failed.get(node["name"])
+        if old_path:
+            node["name"] = old_path
+            node["title"] = os.path.splitext(old_path.rpartition("/")[2])[0]
+    state["unpriced"] = [failed.get(web_path, web_path) for web_path in state["unpriced"]]
+    print(f"   Renamed {len(state['renames']) - len(failed)} files (undo with --undo-renames or fix_filenames.py --undo).")
+    return failed
+
+def undo_renames(base_path):
+    # Reverses the most recent rename batch; only files still under their new name (and not replaced) go back
+    journal = load_rename_journal(base_path)
+    if not journal["batches"]:
+        print("   No renames to undo.")
+        return
+    batch = journal["batches"].pop()
+    print(f"--- Undoing {len(batch['renames'])} renames from {batch['time']} ---")
+    for old_path, new_path in reversed(batch["renames"]):
+        old_full, new_full = os.path.join(base_path, old_path), os.path.join(base_path, new_path)
+        if not os.path.exists(new_full) or os.path.exists(old_full):
+            continue
+        try:
+            os.rename(new_full, old_full)
+            print(f"✅ Restored: {old_path}")
+        except OSError as e:
+            print(f"❌ Error restoring {old_path}: {e}")
+    write_if_changed(base_path, RENAME_JOURNAL_FILE, json.dumps(journal, indent=4))
+
+def scan_directory(base_path, relative_path="", state=None, pool=None):
+    # Returns (contents, totals); totals are the folder's aggregates, summed up in this same pass:
+    # total_files, total_folders, total_value_cents and min/max_price_cents (when anything is priced)
+    contents = []
+    totals = new_totals()
+    
+    entry = list_directory(base_path, relative_path, state)
+    if entry is None:
+        return [], totals
+
+    files = entry["files"]
+    if state and state["renames"] is not None:
+        files = plan_renames(relative_path, files, state)
+
+    # Merge folders and files back into one sorted listing, same order as os.listdir + sort
+    items = sorted([(d, True) for d in entry["dirs"]] + [(f, False) for f in files])
+
+    # With a pool, hand each subfolder to a worker now and collect the results below in listing order
+    pending = {}
+    if pool:
+        for item, is_dir in items:
+            if is_dir:
+                item_rel_path = os.path.join(relative_path, item) if relative_path else item
+                child_state = fork_scan_state(state)
+                pending[item] = (pool.submit(scan_directory, base_path, item_rel_path, child_state), child_state)
     
-    for item in items:
-        if item in IGNORE_LIST: continue
-        full_path = os.path.join(current_scan_path, item)
+    for item, is_dir in items:
         item_rel_path = os.path.join(relative_path, item) if relative_path else item
         
-        if os.path.isdir(full_path):
-            sub_contents, sub_files_count, sub_folders_count = scan_directory(base_path, item_rel_path)
+        if is_dir:
+            if item in pending:
+                future, child_state = pending[item]
+                sub_contents, sub_totals = future.result()
+                merge_scan_state(state, child_state)
+            else:
+                sub_contents, sub_totals = scan_directory(base_path, item_rel_path, state)
             if sub_contents: 
                 folder_obj = { 
                     "name": item, 
                     "type": "folder", 
                     "contents": sub_contents,
-                    "total_files": sub_files_count,
-                    "total_folders": sub_folders_count
+                    **sub_totals
                 }
+                lot_price_cents = parse_folder_price_cents(item)
+                if lot_price_cents is not None:
+                    folder_obj["lot_price_cents"] = lot_price_cents
                 contents.append(folder_obj)
-                total_folders += 1 + sub_folders_count # Count this folder + its subfolders
-                total_files += sub_files_count # Add files from subfolder
+                totals["total_folders"] += 1 + sub_totals["total_folders"] # Count this folder + its subfolders
+                totals["total_files"] += sub_totals["total_files"] # Add files from subfolder
+                if "min_price_cents" in sub_totals:
+                    totals["total_value_cents"] += sub_totals["total_value_cents"]
+                    totals["min_price_cents"] = min(totals.get("min_price_cents", sub_totals["min_price_cents"]), sub_totals["min_price_cents"])
+                    totals["max_price_cents"] = max(totals.get("max_price_cents", sub_totals["max_price_cents"]), sub_totals["max_price_cents"])
                 
-        elif os.path.isfile(full_path):
-            ext = os.path.splitext(item)[1].lower()
-            if ext in IMAGE_EXTENSIONS:
-                web_path = item_rel_path.replace("\\", "/")
-                contents.append({ "name": web_path, "type": "file", "title": os.path.splitext(item)[0] })
-                total_files += 1
+        else:
+            web_path = item_rel_path.replace("\\", "/")
+            file_obj = { "name": web_path, "type": "file", "title": os.path.splitext(item)[0] }
+            price_cents = parse_price_cents(item)
+            if price_cents is not None:
+                file_obj["price_cents"] = price_cents
+                add_price(totals, price_cents)
+            elif state:
+                state["unpriced"].append(web_path)
+            if state:
+                state["lots"].append(file_obj)
+            contents.append(file_obj)
+            totals["total_files"] += 1
+
+    return contents, totals
+
+def walk_nodes(nodes):
+    for node in nodes:
+        yield node
+        if node["type"] == "folder":
+            yield from walk_nodes(node.get("contents", []))
+
+def iter_file_nodes(node):
+    for item in node.get("contents", []):
+        if item["type"] == "folder":
+            yield from iter_file_nodes(item)
+        else:
+            yield item
+
+def hash_file(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def exif_orientation(app1):
+    # Orientation tag (0x0112) from the first IFD of a JPEG's Exif segment, 1 (upright) if it has none
+    if app1[:6] != b'Exif\0\0' or len(app1) < 16: return 1
+    tiff = app1[6:]
+    order = '<' if tiff[:2] == b'II' else '>'
+    ifd = struct.unpack(order + 'I', tiff[4:8])[0]
+    if ifd + 2 > len(tiff): return 1
+    for i in range(struct.unpack(order + 'H', tiff[ifd:ifd + 2])[0]):
+        entry = tiff[ifd + 2 + i * 12:ifd + 14 + i * 12]
+        if len(entry) < 12: break
+        if struct.unpack(order + 'H', entry[:2])[0] == 0x0112:
+            return struct.unpack(order + 'H', entry[8:10])[0]
+    return 1
+
+def jpeg_size(f):
+    # Hops from segment header to segment header until the frame header; the compressed data is never read
+    f.seek(2)
+    orientation = 1
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF: return None
+        code = marker[1]
+        while code == 0xFF:  # Padding before the marker code
+            code = f.read(1)[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8: continue  # Markers with no length
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            # EXIF orientations 5-8 are a quarter turn, browsers show those images with the sides swapped
+            return (height, width) if orientation >= 5 else (width, height)
+        if code == 0xE1 and orientation == 1:
+            orientation = exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, 1)
+
+def image_size(path):
+    # (width, height) from the file header only: a few bytes for PNG/GIF/WebP, the segment headers for JPEG
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+            if head[:2] == b'\xff\xd8':
+                return jpeg_size(f)
+            if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                chunk = head[12:16]
+                if chunk == b'VP8X':
+                    return (int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1)
+                if chunk == b'VP8L':
+                    bits = int.from_bytes(head[21:25], 'little')
+                    return ((bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1)
+                if chunk == b'VP8 ':
+                    width, height = struct.unpack('<HH', head[26:30])
+                    return (width & 0x3FFF, height & 0x3FFF)
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+def read_dimensions(base_path, inventory_structure, manifest, hashes):
+    # Width, height and content version for every file node; sizes are cached by content hash, so only new
+    # images have their header read
+    print("--- Reading Image Sizes ---")
+    cached = manifest.get("sizes", {})
+    sizes = {sha: cached[sha] for sha in sorted(set(hashes.values())) if sha in cached}
+    missing = {}
+    for web_path, sha in hashes.items():
+        if sha not in sizes: missing.setdefault(sha, web_path)
+    if missing:
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            results = pool.map(image_size, [os.path.join(base_path, web_path) for web_path in missing.values()])
+            for sha, size in zip(missing, results):
+                sizes[sha] = list(size) if size else [0, 0]  # Unreadable headers aren't retried until the file changes
+    manifest["sizes"] = sizes
+
+    unknown = 0
+    for node in iter_file_nodes(inventory_structure):
+        sha = hashes.get(node["name"])
+        if sha:
+            node["version"] = sha[:ASSET_VERSION_LENGTH]  # Cache-busting ?v= for the original, see createCard()
+        width, height = sizes.get(sha, (0, 0))
+        if width and height:
+            node["width"], node["height"] = width, height
+        else:
+            unknown += 1
+    print(f"   Read {len(missing)} new image headers" + (f", {unknown} images have an unknown size." if unknown else "."))
+
+def hash_sources(base_path, inventory_structure, manifest, changes, dirty=None):
+    # Content hash for every image, keyed by path -> [mtime, size, inode, hash] in the manifest.
+    # Files whose mtime and size haven't changed are not re-read; a rename keeps inode, mtime and size,
+    # so files moved by fix_filenames.py are matched by those instead of being hashed again.
+    print("--- Hashing Images ---")
+    old_files = manifest.get("files", {})
+    by_stat = {(ino, mtime, size): sha for mtime, size, ino, sha in old_files.values()}
+    files, hashes, to_hash = {}, {}, []
 
-    return contents, total_files, total_folders
+    for node in iter_file_nodes(inventory_structure):
+        web_path = node["name"]
+        old = old_files.get(web_path)
+        if old and dirty is not None and web_path.rpartition("/")[0] not in dirty:
+            files[web_path] = old
+            hashes[web_path] = old[3]
+            continue
+        try:
+            st = os.stat(os.path.join(base_path, web_path))
+        except OSError:
+            continue
+        if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            sha = old[3]
+        elif st.st_ino:  # Some network shares report no inode at all
+            sha = by_stat.get((st.st_ino, st.st_mtime_ns, st.st_size))
+        else:
+            sha = None
+        if sha:
+            files[web_path] = [st.st_mtime_ns, st.st_size, st.st_ino, sha]
+            hashes[web_path] = sha
+        else:
+            to_hash.append((web_path, st))
+
+    def try_hash(item):
+        # A scan moved or deleted since the stat above is skipped like any other unreadable file
+        try:
+            return hash_file(os.path.join(base_path, item[0]))
+        except OSError:
+            return None
+
+    unreadable = 0
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            for (web_path, st), sha in zip(to_hash, pool.map(try_hash, to_hash)):
+                if sha is None:
+                    unreadable += 1
+                    continue
+                files[web_path] = [st.st_mtime_ns, st.st_size, st.st_ino, sha]
+                hashes[web_path] = sha
+
+    # Lots added, removed or re-photographed since the last build, for the upload step
+    changes["added"].extend(sorted(files.keys() - old_files.keys()))
+    changes["removed"].extend(sorted(old_files.keys() - files.keys()))
+    changes["changed"].extend(sorted(path for path in files.keys() & old_files.keys() if files[path][3] != old_files[path][3]))
+    manifest["files"] = files
+    print(f"   Hashed {len(to_hash) - unreadable} new or changed images, {len(hashes) - len(to_hash) + unreadable} unchanged."
+          + (f" {unreadable} could not be read (moved or deleted mid-build?)." if unreadable else ""))
+    return hashes
+
+def load_lot_ids(base_path, manifest=None):
+    try:
+        with open(os.path.join(base_path, LOT_IDS_FILE), 'r', encoding='utf-8') as f:
+            lot_ids = json.load(f)
+        if isinstance(lot_ids.get("next"), int) and isinstance(lot_ids.get("lots"), dict):
+            return lot_ids
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Builds before LOT_IDS_FILE kept the ids in the manifest
+    return (manifest or {}).get("lot_ids") or {"next": 1, "lots": {}}
+
+def save_lot_ids(base_path, lot_ids, changes):
+    # One lot per line, so the uploaded file diffs cleanly
+    lines = [f"{json.dumps(web_path, ensure_ascii=False)}: {json.dumps(entry)}" for web_path, entry in sorted(lot_ids["lots"].items())]
+    text = '{\n"next": ' + str(lot_ids["next"]) + ',\n"lots": {\n' + ",\n".join(lines) + '\n}\n}\n'
+    write_if_changed(base_path, LOT_IDS_FILE, text, changes)
+
+def assign_lot_ids(inventory_structure, old, hashes):
+    # Every lot gets a small integer id, which the page uses for the cart and its click handlers. old is the last
+    # build's path -> [id, short hash] map (load_lot_ids): a lot keeps its id when its scan is renamed or moved
+    # (same hash) or re-photographed (same path). Ids are never handed out twice, so a saved cart can't end up
+    # holding another lot. Returns the new map.
+    next_id = max([old["next"]] + [entry[0] + 1 for entry in old["lots"].values()])
+    nodes = sorted(iter_file_nodes(inventory_structure), key=lambda node: node["name"])
+    versions = {node["name"]: hashes[node["name"]][:ASSET_VERSION_LENGTH] for node in nodes if node["name"] in hashes}
+    lots, used = {}, set()
+
+    # Unchanged lots first, so a copy of a scan can't take the original's id
+    for node in nodes:
+        previous = old["lots"].get(node["name"])
+        if previous and previous[1] == versions.get(node["name"]):
+            lots[node["name"]] = previous
+            used.add(previous[0])
+
+    by_version = {}
+    for lot_id, version in sorted(old["lots"].values()):
+        if version and lot_id not in used: by_version.setdefault(version, []).append(lot_id)
+    for node in nodes:
+        web_path = node["name"]
+        if web_path in lots: continue
+        version = versions.get(web_path)
+        candidates = by_version.get(version, []) + [old["lots"].get(web_path, [None])[0]]
+        lot_id = next((lot_id for lot_id in candidates if lot_id is not None and lot_id not in used), None)
+        if lot_id is None:
+            lot_id, next_id = next_id, next_id + 1
+        lots[web_path] = [lot_id, version]
+        used.add(lot_id)
+
+    for node in nodes:
+        node["id"] = lots[node["name"]][0]
+    return {"next": next_id, "lots": lots}
+
+# The only reason an original is tried again on the next build; anything else is remembered by content hash
+JPEGTRAN_MISSING = "jpegtran not installed"
+
+def optimize_original(src_path, jpegtran):
+    # Runs in a worker process. The original is only replaced when the result is smaller or had to be rotated;
+    # returns (replaced, bytes before, bytes after, None) or (False, None, None, reason it was left alone)
+    tmp_path = src_path + '.tmp'
+    try:
+        before = os.path.getsize(src_path)
+        with Image.open(src_path) as im:
+            fmt = im.format
+            orientation = im.getexif().get(0x0112, 1)
+            if fmt == 'PNG':
+                # Pillow only writes the pixels, palette, transparency and colour profile back; text and EXIF chunks go
+                ImageOps.exif_transpose(im).save(tmp_path, format='PNG', optimize=True)
+        if fmt == 'JPEG':
+            if not jpegtran:
+                return False, None, None, JPEGTRAN_MISSING
+            # -copy icc keeps the colour profile (APP2) and drops the rest, like the PNG path
+            command = [jpegtran, '-copy', 'icc', '-optimize', '-progressive']
+            if orientation in ORIENTATION_TRANSFORMS:
+                command += ['-perfect', *ORIENTATION_TRANSFORMS[orientation]]
+            result = subprocess.run(command + ['-outfile', tmp_path, src_path], capture_output=True, text=True)
+            if result.returncode != 0:
+                return False, None, None, result.stderr.strip() or f"jpegtran exited with {result.returncode}"
+        elif fmt != 'PNG':
+            return False, before, before, None  # WebP and GIF have no lossless re-encode worth doing
+
+        after = os.path.getsize(tmp_path)
+        if after < before or orientation in ORIENTATION_TRANSFORMS:
+            os.replace(tmp_path, src_path)
+            return True, before, after, None
+        return False, before, before, None
+    except Exception as e:
+        return False, None, None, str(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def optimize_originals(base_path, manifest, hashes, changes):
+    print("--- Optimizing Originals ---")
+    if Image is None:
+        print("⚠️ Pillow is not installed (pip install Pillow), originals left as they are.")
+        return
+    jpegtran = shutil.which('jpegtran')
+    if not jpegtran:
+        print("⚠️ jpegtran not found (it comes with libjpeg-turbo), JPEGs left as they are.")
+
+    # Content hashes of files that came out of (or needed nothing from) an earlier optimize run
+    done = set(manifest.get("optimized", []))
+    jobs = [web_path for web_path, sha in hashes.items() if sha not in done]
+    saved_before = saved_after = optimized = 0
+    skipped = {}
+    if jobs:
+        added, changed = set(changes["added"]), set(changes["changed"])
+        with ProcessPoolExecutor(max_workers=OPTIMIZE_WORKERS) as pool:
+            futures = {pool.submit(optimize_original, os.path.join(base_path, web_path), jpegtran): web_path for web_path in jobs}
+            for future in as_completed(futures):
+                web_path = futures[future]
+                replaced, before, after, reason = future.result()
+                if reason:
+                    skipped[reason] = skipped.get(reason, 0) + 1
+                    # Failures such as jpegtran -perfect refusing a rotation would fail the same way every build
+                    if reason != JPEGTRAN_MISSING: done.add(hashes[web_path])
+                    continue
+                if replaced:
+                    # New content: record its hash so the next build neither re-hashes nor re-optimizes it
+                    full_path = os.path.join(base_path, web_path)
+                    st = os.stat(full_path)
+                    sha = hash_file(full_path)
+                    manifest["files"][web_path] = [st.st_mtime_ns, st.st_size, st.st_ino, sha]
+                    hashes[web_path] = sha
+                    if web_path not in added and web_path not in changed:
+                        changes["changed"].append(web_path)
+                    optimized += 1
+                    saved_before += before
+                    saved_after += after
+                done.add(hashes[web_path])
+    manifest["optimized"] = sorted(done & set(hashes.values()))
+
+    saved = saved_before - saved_after
+    print(f"   Optimized {optimized} of {len(jobs)} new images, saved {saved / 1024:,.1f} KB"
+          + (f" ({100 * saved / saved_before:.1f}% of those files)." if saved_before else "."))
+    for reason, count in sorted(skipped.items()):
+        retry = " (tried again once it is installed)" if reason == JPEGTRAN_MISSING else " (not retried until the file changes)"
+        print(f"⚠️ Left {count} images as they are{retry}: {reason}")
+
+def perceptual_hash(src_path):
+    # Runs in a worker process: dHash, i.e. whether each pixel of a 9x8 greyscale thumbnail is brighter than the
+    # one to its right. Survives re-saving, resizing and small exposure changes, unlike a content hash.
+    try:
+        with Image.open(src_path) as im:
+            im.draft('L', (64, 64))
+            pixels = ImageOps.exif_transpose(im).convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    except Exception:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def bk_insert(tree, value, item):
+    # BK-tree node: [value, items, {distance: child}]. Children sit at their distance from the parent, so a
+    # search can skip every subtree the triangle inequality rules out instead of comparing all pairs.
+    if tree is None:
+        return [value, [item], {}]
+    node = tree
+    while True:
+        distance = hamming(value, node[0])
+        if distance == 0:
+            node[1].append(item)
+            return tree
+        if distance not in node[2]:
+            node[2][distance] = [value, [item], {}]
+            return tree
+        node = node[2][distance]
+
+def bk_search(tree, value, max_distance):
+    found, stack = [], [tree] if tree else []
+    while stack:
+        node = stack.pop()
+        distance = hamming(value, node[0])
+        if distance <= max_distance:
+            found.append((distance, node[1]))
+        for child_distance, child in node[2].items():
+            if distance - max_distance <= child_distance <= distance + max_distance:
+                stack.append(child)
+    return found
+
+def find_duplicates(base_path, inventory_structure, manifest, hashes):
+    print("--- Looking for Duplicate Lots ---")
+    if Image is None:
+        print("⚠️ Pillow is not installed (pip install Pillow), skipping duplicate check.")
+        return
+
+    # Perceptual hashes are cached by content hash, so only new images get decoded
+    cached = manifest.get("phash", {})
+    phashes = {sha: cached[sha] for sha in sorted(set(hashes.values())) if sha in cached}
+    missing = {}
+    for web_path, sha in hashes.items():
+        if sha not in phashes: missing.setdefault(sha, web_path)
+    if missing:
+        with ProcessPoolExecutor(max_workers=THUMB_WORKERS) as pool:
+            results = pool.map(perceptual_hash, [os.path.join(base_path, web_path) for web_path in missing.values()], chunksize=16)
+            for sha, phash in zip(missing, results):
+                if phash: phashes[sha] = phash
+    manifest["phash"] = phashes
+
+    # Every image goes into the tree once; identical hashes share a node
+    tree = None
+    for web_path, sha in sorted(hashes.items()):
+        if sha in phashes:
+            tree = bk_insert(tree, int(phashes[sha], 16), web_path)
+
+    # Near-duplicates are joined into groups (a ~ b and b ~ c puts all three together)
+    group_of = {}
+    for web_path, sha in sorted(hashes.items()):
+        if sha not in phashes or web_path in group_of: continue
+        group, pending = {web_path}, [web_path]
+        while pending:
+            for distance, matches in bk_search(tree, int(phashes[hashes[pending.pop()]], 16), DUPLICATE_DISTANCE):
+                for match in matches:
+                    if match not in group:
+                        group.add(match)
+                        pending.append(match)
+        if len(group) > 1:
+            for match in group: group_of[match] = group
+
+    # Report grouped by the folders involved
+    prices = {node["name"]: node.get("price_cents") for node in iter_file_nodes(inventory_structure)}
+    by_folders = {}
+    for group in {id(group): group for group in group_of.values()}.values():
+        folders = " + ".join(sorted({web_path.rpartition("/")[0] or "(top level)" for web_path in group}))
+        by_folders.setdefault(folders, []).append(sorted(group))
+    lines = []
+    for folders in sorted(by_folders):
+        lines.append(f"{folders}:")
+        for group in sorted(by_folders[folders]):
+            lines.append("   " + " = ".join(f"{web_path.rpartition('/')[2]} ({format_cents(prices.get(web_path))})" for web_path in group))
+
+    report_path = os.path.join(base_path, DUPLICATE_REPORT_FILE)
+    groups = sum(len(groups) for groups in by_folders.values())
+    print(f"   Checked {len(hashes)} images ({len(missing)} new).")
+    if not groups:
+        print("   No duplicate lots found.")
+        if os.path.exists(report_path): os.remove(report_path)
+        return
+    print(f"⚠️ {groups} groups of images look like the same lot:")
+    for line in lines[:20]:
+        print(f"   {line}")
+    if len(lines) > 20:
+        print(f"   ... see {DUPLICATE_REPORT_FILE} for the rest")
+    write_if_changed(base_path, DUPLICATE_REPORT_FILE, "\n".join(lines) + "\n")
+
+def derived_path(sha, suffix):
+    return f"{DERIVED_DIR}/{sha[:2]}/{sha}{suffix}"
+
+def touch_derived(manifest, sha):
+    # Record that this build still uses the source's derivatives (day resolution keeps the manifest stable)
+    entry = manifest.setdefault("derived", {}).setdefault(sha, {"used": 0, "files": []})
+    entry["used"] = int(time.time() // 86400)
+    return entry
+
+def evict_derivatives(base_path, manifest, live_hashes, changes, sweep=False):
+    print("--- Evicting Stale Derivatives ---")
+    derived = manifest.setdefault("derived", {})
+    today = int(time.time() // 86400)
+    orphans = sorted((entry["used"], sha) for sha, entry in derived.items() if sha not in live_hashes)
+
+    removed = evicted = 0
+    for used, sha in orphans:  # Least recently used first
+        if today - used < DERIVED_ORPHAN_DAYS: break
+        evicted += 1
+        for rel_path in derived.pop(sha)["files"]:
+            try:
+                os.remove(os.path.join(base_path, rel_path))
+                changes["outputs"].add(rel_path)
+                removed += 1
+            except OSError:
+                pass
+    print(f"   Removed {removed} files from {evicted} deleted images, {len(orphans) - evicted} kept until unused for {DERIVED_ORPHAN_DAYS} days.")
+    if not sweep: return
+
+    # Sweep files no entry accounts for (e.g. leftovers from older layouts or crashed runs)
+    removed = 0
+    tracked = {os.path.normcase(os.path.join(base_path, rel_path)) for entry in derived.values() for rel_path in entry["files"]}
+    for root, dirs, files in os.walk(os.path.join(base_path, DERIVED_DIR), topdown=False):
+        for filename in files:
+            full_path = os.path.join(root, filename)
+            if os.path.normcase(full_path) not in tracked:
+                os.remove(full_path)
+                changes["outputs"].add(os.path.relpath(full_path, base_path).replace("\\", "/"))
+                removed += 1
+        if root != os.path.join(base_path, DERIVED_DIR) and not os.listdir(root):
+            os.rmdir(root)
+    print(f"   Swept {removed} untracked files from {DERIVED_DIR}/.")
+
+def thumbnail_format():
+    # WebP when this Pillow build supports it, otherwise JPEG
+    return 'webp' if features.check('webp') else 'jpeg'
+
+def thumbnail_path(sha, width, fmt):
+    return derived_path(sha, f"_{width}.webp" if fmt == 'webp' else f"_{width}.jpg")
+
+def render_thumbnails(src_path, targets, fmt):
+    # Runs in a worker process: decode the original once and write every requested width
+    try:
+        with Image.open(src_path) as im:
+            largest = max(width for width, _ in targets)
+            im.draft('RGB', (largest, largest))  # Let JPEG decode at a reduced scale, much faster
+            im = ImageOps.exif_transpose(im)
+            if fmt == 'jpeg' or im.mode not in ('RGB', 'RGBA'):
+                im = im.convert('RGB')
+            for width, out_path in sorted(targets, reverse=True):
+                thumb = im.copy()
+                thumb.thumbnail((width, width * 4))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                tmp_path = out_path + '.tmp'
+                thumb.save(tmp_path, format=fmt.upper(), quality=THUMB_QUALITY)
+                os.replace(tmp_path, out_path)
+    except Exception as e:
+        return f"{src_path}: {e}"
+    return None
+
+def generate_thumbnails(base_path, inventory_structure, manifest, hashes, changes):
+    print("--- Generating Thumbnails ---")
+    if Image is None:
+        print("⚠️ Pillow is not installed (pip install Pillow), grid will load full-size images.")
+        return
+
+    # Identical scans share one job; the manifest already knows which derivatives exist
+    fmt = thumbnail_format()
+    jobs = {}
+    for node in iter_file_nodes(inventory_structure):
+        sha = hashes.get(node["name"])
+        if not sha: continue
+        entry = touch_derived(manifest, sha)
+        srcset = [[thumbnail_path(sha, width, fmt), width] for width in THUMB_WIDTHS]
+        if all(rel_path in entry["files"] for rel_path, _ in srcset):
+            node["thumb"] = srcset[0][0]
+            node["srcset"] = srcset
+        elif sha in jobs:
+            jobs[sha][1].append(node)
+        else:
+            jobs[sha] = (os.path.join(base_path, node["name"]), [node], srcset)
+
+    failed = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=THUMB_WORKERS) as pool:
+            futures = {}
+            for sha, (src_path, nodes, srcset) in jobs.items():
+                targets = [(width, os.path.join(base_path, rel_path)) for rel_path, width in srcset]
+                futures[pool.submit(render_thumbnails, src_path, targets, fmt)] = sha
+            for future in as_completed(futures):
+                sha = futures[future]
+                src_path, nodes, srcset = jobs[sha]
+                error = future.result()
+                if error:
+                    print(f"❌ Thumbnail failed for {error}")
+                    failed += 1
+                    continue
+                entry = manifest["derived"][sha]
+                entry["files"] = sorted(set(entry["files"]) | {rel_path for rel_path, _ in srcset})
+                changes["outputs"].update(rel_path for rel_path, _ in srcset)
+                for node in nodes:
+                    node["thumb"] = srcset[0][0]
+                    node["srcset"] = srcset
+    print(f"   Rendered thumbnails for {len(jobs) - failed} images, {failed} failed, others reused from cache.")
+
+BLURHASH_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+SRGB_TO_LINEAR = [v / 255 / 12.92 if v <= 10 else ((v / 255 + 0.055) / 1.055) ** 2.4 for v in range(256)]
+
+def base83(value, length):
+    return "".join(BLURHASH_DIGITS[value // 83 ** i % 83] for i in reversed(range(length)))
+
+def linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def blurhash(src_path, components=PLACEHOLDER_COMPONENTS):
+    # Runs in a worker process. Same encoding as the reference BlurHash encoder: the average colour, then
+    # the strongest cosine components, quantised and written in base 83. placeholderUrl() in the page reverses it.
+    size = PLACEHOLDER_SAMPLE
+    try:
+        with Image.open(src_path) as im:
+            im.draft('RGB', (size * 4, size * 4))
+            pixels = ImageOps.exif_transpose(im).convert('RGB').resize((size, size), Image.BOX).tobytes()
+    except Exception:
+        return None
+    linear = [SRGB_TO_LINEAR[value] for value in pixels]
+    columns, rows = components
+    cos_x = [[math.cos(math.pi * i * x / size) for x in range(size)] for i in range(columns)]
+    cos_y = [[math.cos(math.pi * j * y / size) for y in range(size)] for j in range(rows)]
+
+    factors = []
+    for j in range(rows):
+        for i in range(columns):
+            r = g = b = 0.0
+            for y in range(size):
+                for x in range(size):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    offset = (y * size + x) * 3
+                    r += basis * linear[offset]
+                    g += basis * linear[offset + 1]
+                    b += basis * linear[offset + 2]
+            scale = (1 if i == j == 0 else 2) / (size * size)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = base83(columns - 1 + (rows - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, math.floor(max(abs(c) for factor in ac for c in factor) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += base83(quantised_max, 1)
+    result += base83((linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8) + linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, math.floor(math.copysign(abs(c / maximum) ** 0.5, c) * 9 + 9.5))) for c in factor)
+        result += base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+def generate_placeholders(base_path, inventory_structure, manifest, hashes):
+    print("--- Generating Placeholders ---")
+    if Image is None:
+        print("⚠️ Pillow is not installed (pip install Pillow), cards show a plain grey box while loading.")
+        return
+
+    # Cached by content hash; new images are encoded from their smallest thumbnail when there is one,
+    # which decodes far faster than the original
+    cached = manifest.get("blurhash", {})
+    placeholders = {sha: cached[sha] for sha in sorted(set(hashes.values())) if sha in cached}
+    missing = {}
+    for node in iter_file_nodes(inventory_structure):
+        sha = hashes.get(node["name"])
+        if sha and sha not in placeholders and sha not in missing:
+            missing[sha] = os.path.join(base_path, node.get("thumb") or node["name"])
+    if missing:
+        with ProcessPoolExecutor(max_workers=THUMB_WORKERS) as pool:
+            results = pool.map(blurhash, missing.values(), chunksize=16)
+            for sha, placeholder in zip(missing, results):
+                if placeholder: placeholders[sha] = placeholder
+    manifest["blurhash"] = placeholders
+
+    added = 0
+    for node in iter_file_nodes(inventory_structure):
+        placeholder = placeholders.get(hashes.get(node["name"]))
+        if placeholder:
+            node["blurhash"] = placeholder
+            added += len(placeholder)
+    print(f"   Encoded {len(missing)} new images, placeholders add {added / 1024:,.1f} KB to the inventory before compression.")
+
+def build_search_index(inventory_structure):
+    # Lots are numbered depth-first, which makes every folder's lots one contiguous range: a folder's name is
+    # posted once, in "ft", and the page expands it to that range. Docs only say where the lot's node is
+    # (folder number, position in its contents) plus its id; everything else is read from the node.
+    folders, docs, postings, folder_postings = [], [], {}, {}
+    buckets = [[low, high, []] for low, high in zip(PRICE_BUCKETS_CENTS, PRICE_BUCKETS_CENTS[1:] + (None,))]
+
+    def add_folder(node, parent_number, name):
+        number = len(folders)
+        folders.append([parent_number, name, len(docs), 0])
+        for token in sorted(set(tokenize(name))):
+            folder_postings.setdefault(token, []).append(number)
+        for position, item in enumerate(node.get("contents", [])):
+            if item["type"] == "folder":
+                add_folder(item, number, item["name"])
+                continue
+            lot_number = len(docs)
+            docs.append([number, position, item["id"]])
+            for token in sorted(set(tokenize(item["title"]))):
+                postings.setdefault(token, []).append(lot_number)
+            price = item.get("price_cents")
+            if price is not None:
+                for low, high, ids in buckets:
+                    if price >= low and (high is None or price < high):
+                        ids.append(lot_number)
+                        break
+        folders[number][3] = len(docs) - folders[number][2]
+
+    add_folder(inventory_structure, -1, "")
+    # Sorted tokens: the same vault always produces byte-identical output
+    return {"f": folders, "d": docs, "t": {token: postings[token] for token in sorted(postings)},
+            "ft": {token: folder_postings[token] for token in sorted(folder_postings)}, "b": buckets}
+
+def shard_name(folder_path):
+    return hashlib.blake2b(folder_path.encode('utf-8'), digest_size=8).hexdigest()
+
+def split_into_shards(node, folder_path, shards):
+    # Returns a copy of node's contents where every subfolder is a stub pointing at its own shard
+    contents = []
+    for item in node["contents"]:
+        if item["type"] == "folder":
+            child_path = f"{folder_path}/{item['name']}" if folder_path else item["name"]
+            shard_url = f"{INVENTORY_DIR}/{shard_name(child_path)}.json"
+            shards[shard_url] = split_into_shards(item, child_path, shards)
+            stub = {key: value for key, value in item.items() if key != "contents"}
+            stub["shard"] = shard_url
+            contents.append(stub)
+        else:
+            contents.append(item)
+    return contents
+
+def pack_inventory(contents):
+    # Compact wire format, see unpackInventory() in HTML_TEMPLATE for the layout
+    prefixes, prefix_index = [], {}
+    folder_keys, file_keys = [], []
+    for node in walk_nodes(contents):
+        if node["type"] == "folder":
+            keys, skip = folder_keys, ("name", "type", "contents")
+        else:
+            keys, skip = file_keys, ("name", "type", "title")
+        for key in node:
+            if key not in skip and key not in keys: keys.append(key)
+
+    def pack_rows(nodes):
+        rows = []
+        for node in nodes:
+            if node["type"] == "folder":
+                row = [node["name"], pack_rows(node["contents"]) if "contents" in node else 0]
+                keys = folder_keys
+            else:
+                prefix, _, filename = node["name"].rpartition("/")
+                prefix = prefix + "/" if prefix else ""
+                if prefix not in prefix_index:
+                    prefix_index[prefix] = len(prefixes)
+                    prefixes.append(prefix)
+                row = [prefix_index[prefix], filename]
+                keys = file_keys
+            row.extend(node.get(key) for key in keys)
+            while row[-1] is None: row.pop()  # Trailing missing values cost nothing
+            rows.append(row)
+        return rows
+
+    rows = pack_rows(contents)
+    return {"v": INVENTORY_FORMAT_VERSION, "p": prefixes, "f": folder_keys, "i": file_keys, "c": rows}
+
+def serialize_inventory(contents, compact):
+    if compact:
+        return json.dumps(pack_inventory(contents), separators=(',', ':'), ensure_ascii=False)
+    return json.dumps(contents, indent=4)
+
+def write_shards(base_path, shards, changes, compact=False, search_index=None):
+    shard_dir = os.path.join(base_path, INVENTORY_DIR)
+    # Only shards whose folder actually changed get rewritten
+    written = 0
+    for shard_url, contents in shards.items():
+        if compact:
+            text = serialize_inventory(contents, compact=True)
+        else:
+            text = json.dumps(contents, separators=(',', ':'))
+        written += write_if_changed(base_path, shard_url, text, changes)
+    live = {os.path.basename(shard_url) for shard_url in shards}
+    if search_index is not None:
+        written += write_if_changed(base_path, SEARCH_INDEX_FILE, json.dumps(search_index, separators=(',', ':'), ensure_ascii=False), changes)
+        live.add(os.path.basename(SEARCH_INDEX_FILE))
+    live |= {filename + suffix for filename in live for suffix in ('.gz', '.br')}  # Their compressed copies
+    if "memory" in changes or not os.path.isdir(shard_dir):
+        return written
+    # Shards of folders that no longer exist
+    for filename in os.listdir(shard_dir):
+        if filename not in live:
+            os.remove(os.path.join(shard_dir, filename))
+            changes["outputs"].add(f"{INVENTORY_DIR}/{filename}")
+    return written
+
+# --- STYLESHEET ---
+# The page used to load the Tailwind CDN script, which compiles CSS in the browser on every visit, plus all of
+# Font Awesome. Instead the build picks every class-like word out of HTML_TEMPLATE (markup and the JS template
+# strings alike, as Tailwind's own content scan does), writes CSS for the ones that are Tailwind utilities or
+# Font Awesome icons, and inlines it. Class names in the markup that are neither get a warning at build time.
+
+# Tailwind v3 default palette, only the colour families the page uses
+TAILWIND_COLORS = {
+    'gray': {50: 'f9fafb', 100: 'f3f4f6', 200: 'e5e7eb', 300: 'd1d5db', 400: '9ca3af', 500: '6b7280', 600: '4b5563', 700: '374151', 800: '1f2937', 900: '111827'},
+    'slate': {50: 'f8fafc', 100: 'f1f5f9', 200: 'e2e8f0', 300: 'cbd5e1', 400: '94a3b8', 500: '64748b', 600: '475569', 700: '334155', 800: '1e293b', 900: '0f172a'},
+    'red': {50: 'fef2f2', 100: 'fee2e2', 200: 'fecaca', 300: 'fca5a5', 400: 'f87171', 500: 'ef4444', 600: 'dc2626', 700: 'b91c1c', 800: '991b1b', 900: '7f1d1d'},
+    'yellow': {50: 'fefce8', 100: 'fef9c3', 200: 'fef08a', 300: 'fde047', 400: 'facc15', 500: 'eab308', 600: 'ca8a04', 700: 'a16207', 800: '854d0e', 900: '713f12'},
+    'green': {50: 'f0fdf4', 100: 'dcfce7', 200: 'bbf7d0', 300: '86efac', 400: '4ade80', 500: '22c55e', 600: '16a34a', 700: '15803d', 800: '166534', 900: '14532d'},
+    'blue': {50: 'eff6ff', 100: 'dbeafe', 200: 'bfdbfe', 300: '93c5fd', 400: '60a5fa', 500: '3b82f6', 600: '2563eb', 700: '1d4ed8', 800: '1e40af', 900: '1e3a8a'},
+}
+TAILWIND_SCREENS = {'sm': 640, 'md': 768, 'lg': 1024, 'xl': 1280}
+TAILWIND_FONT_SIZES = {'xs': ('.75rem', '1rem'), 'sm': ('.875rem', '1.25rem'), 'base': ('1rem', '1.5rem'), 'lg': ('1.125rem', '1.75rem'),
+                       'xl': ('1.25rem', '1.75rem'), '2xl': ('1.5rem', '2rem'), '3xl': ('1.875rem', '2.25rem'), '4xl': ('2.25rem', '2.5rem'),
+                       '5xl': ('3rem', '1'), '6xl': ('3.75rem', '1')}
+TAILWIND_MAX_WIDTHS = {'xs': '20rem', 'sm': '24rem', 'md': '28rem', 'lg': '32rem', 'xl': '36rem', '2xl': '42rem', '3xl': '48rem', '4xl': '56rem', 'full': '100%'}
+TAILWIND_SHADOWS = {
+    'shadow-sm': '0 1px 2px 0 rgb(0 0 0/.05)',
+    'shadow': '0 1px 3px 0 rgb(0 0 0/.1),0 1px 2px -1px rgb(0 0 0/.1)',
+    'shadow-md': '0 4px 6px -1px rgb(0 0 0/.1),0 2px 4px -2px rgb(0 0 0/.1)',
+    'shadow-lg': '0 10px 15px -3px rgb(0 0 0/.1),0 4px 6px -4px rgb(0 0 0/.1)',
+    'shadow-xl': '0 20px 25px -5px rgb(0 0 0/.1),0 8px 10px -6px rgb(0 0 0/.1)',
+    'shadow-inner': 'inset 0 2px 4px 0 rgb(0 0 0/.05)',
+    'shadow-none': '0 0 #0000',
+}
+TAILWIND_TRANSITIONS = {
+    'transition': 'color,background-color,border-color,text-decoration-color,fill,stroke,opacity,box-shadow,transform,filter,backdrop-filter',
+    'transition-colors': 'color,background-color,border-color,text-decoration-color,fill,stroke',
+    'transition-opacity': 'opacity', 'transition-transform': 'transform', 'transition-all': 'all',
+}
+TAILWIND_STATIC = {
+    # Written in Tailwind's own order, which decides who wins when two utilities set the same property
+    'pointer-events-none': 'pointer-events:none', 'pointer-events-auto': 'pointer-events:auto',
+    'static': 'position:static', 'fixed': 'position:fixed', 'absolute': 'position:absolute', 'relative': 'position:relative', 'sticky': 'position:sticky',
+    'col-span-full': 'grid-column:1/-1',
+    'mx-auto': 'margin-left:auto;margin-right:auto',
+    'block': 'display:block', 'inline-block': 'display:inline-block', 'inline': 'display:inline', 'flex': 'display:flex',
+    'inline-flex': 'display:inline-flex', 'grid': 'display:grid', 'hidden': 'display:none',
+    'flex-1': 'flex:1 1 0%', 'flex-none': 'flex:none', 'shrink-0': 'flex-shrink:0',
+    'cursor-pointer': 'cursor:pointer', 'cursor-not-allowed': 'cursor:not-allowed',
+    'select-none': 'user-select:none', 'list-inside': 'list-style-position:inside', 'list-decimal': 'list-style-type:decimal', 'list-disc': 'list-style-type:disc',
+    'flex-row': 'flex-direction:row', 'flex-col': 'flex-direction:column', 'flex-wrap': 'flex-wrap:wrap',
+    'items-start': 'align-items:flex-start', 'items-end': 'align-items:flex-end', 'items-center': 'align-items:center',
+    'justify-start': 'justify-content:flex-start', 'justify-end': 'justify-content:flex-end', 'justify-center': 'justify-content:center', 'justify-between': 'justify-content:space-between',
+    'overflow-hidden': 'overflow:hidden', 'overflow-x-auto': 'overflow-x:auto', 'overflow-y-auto': 'overflow-y:auto',
+    'truncate': 'overflow:hidden;text-overflow:ellipsis;white-space:nowrap', 'whitespace-nowrap': 'white-space:nowrap', 'break-all': 'word-break:break-all',
+    'rounded-none': 'border-radius:0', 'rounded-sm': 'border-radius:.125rem', 'rounded': 'border-radius:.25rem', 'rounded-md': 'border-radius:.375rem',
+    'rounded-lg': 'border-radius:.5rem', 'rounded-xl': 'border-radius:.75rem', 'rounded-full': 'border-radius:9999px',
+    'object-contain': 'object-fit:contain', 'object-cover': 'object-fit:cover',
+    'text-left': 'text-align:left', 'text-center': 'text-align:center', 'text-right': 'text-align:right',
+    'font-mono': 'font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,"Liberation Mono","Courier New",monospace',
+    'font-normal': 'font-weight:400', 'font-medium': 'font-weight:500', 'font-semibold': 'font-weight:600', 'font-bold': 'font-weight:700',
+    'uppercase': 'text-transform:uppercase', 'italic': 'font-style:italic',
+    'leading-none': 'line-height:1', 'leading-tight': 'line-height:1.25', 'leading-snug': 'line-height:1.375', 'leading-normal': 'line-height:1.5',
+    'tracking-tight': 'letter-spacing:-.025em', 'tracking-wide': 'letter-spacing:.025em', 'tracking-wider': 'letter-spacing:.05em', 'tracking-widest': 'letter-spacing:.1em',
+    'underline': 'text-decoration-line:underline', 'no-underline': 'text-decoration-line:none',
+    'outline-none': 'outline:2px solid transparent;outline-offset:2px',
+}
+TAILWIND_STATIC_ORDER = {name: i * 10 for i, name in enumerate(TAILWIND_STATIC)}
+TAILWIND_SPACING_SIDES = {'': ('',), 'x': ('-left', '-right'), 'y': ('-top', '-bottom'), 't': ('-top',), 'r': ('-right',), 'b': ('-bottom',), 'l': ('-left',)}
+
+# Icons are drawn from inline SVG outlines (Font Awesome 4.7 glyphs, SIL OFL 1.1), so the page loads no icon font.
+# name -> (advance width, path) in font units: 1792 per em, y up from the baseline, 256 below it. Only icons the
+# page uses end up in the stylesheet; an unknown one gets a warning at build time. eBay has no 4.7 glyph, a bag stands in.
+FA_UNITS_PER_EM, FA_ASCENT = 1792, 1536
+FA_ICONS = {
+    'arrow-left': (1536, 'M1536 640v-128q0 -53 -32.5 -90.5t-84.5 -37.5h-704l293 -294q38 -36 38 -90t-38 -90l-75 -76q-37 -37 -90 -37q-52 0 -91 37l-651 652q-37 37 -37 90q0 52 37 91l651 650q38 38 91 38q52 0 90 -38l75 -74q38 -38 38 -91t-38 -91l-293 -293h704q52 0 84.5 -37.5 t32.5 -90.5z'),
+    'cart-plus': (1664, 'M1216 832q0 26 -19 45t-45 19h-128v128q0 26 -19 45t-45 19t-45 -19t-19 -45v-128h-128q-26 0 -45 -19t-19 -45t19 -45t45 -19h128v-128q0 -26 19 -45t45 -19t45 19t19 45v128h128q26 0 45 19t19 45zM640 0q0 -53 -37.5 -90.5t-90.5 -37.5t-90.5 37.5t-37.5 90.5 t37.5 90.5t90.5 37.5t90.5 -37.5t37.5 -90.5zM1536 0q0 -53 -37.5 -90.5t-90.5 -37.5t-90.5 37.5t-37.5 90.5t37.5 90.5t90.5 37.5t90.5 -37.5t37.5 -90.5zM1664 1088v-512q0 -24 -16 -42.5t-41 -21.5l-1044 -122q1 -7 4.5 -21.5t6 -26.5t2.5 -22q0 -16 -24 -64h920 q26 0 45 -19t19 -45t-19 -45t-45 -19h-1024q-26 0 -45 19t-19 45q0 14 11 39.5t29.5 59.5t20.5 38l-177 823h-204q-26 0 -45 19t-19 45t19 45t45 19h256q16 0 28.5 -6.5t20 -15.5t13 -24.5t7.5 -26.5t5.5 -29.5t4.5 -25.5h1201q26 0 45 -19t19 -45z'),
+    'cart-shopping': (1664, 'M640 0q0 -52 -38 -90t-90 -38t-90 38t-38 90t38 90t90 38t90 -38t38 -90zM1536 0q0 -52 -38 -90t-90 -38t-90 38t-38 90t38 90t90 38t90 -38t38 -90zM1664 1088v-512q0 -24 -16.5 -42.5t-40.5 -21.5l-1044 -122q13 -60 13 -70q0 -16 -24 -64h920q26 0 45 -19t19 -45 t-19 -45t-45 -19h-1024q-26 0 -45 19t-19 45q0 11 8 31.5t16 36t21.5 40t15.5 29.5l-177 823h-204q-26 0 -45 19t-19 45t19 45t45 19h256q16 0 28.5 -6.5t19.5 -15.5t13 -24.5t8 -26t5.5 -29.5t4.5 -26h1201q26 0 45 -19t19 -45z'),
+    'check': (1792, 'M1671 970q0 -40 -28 -68l-724 -724l-136 -136q-28 -28 -68 -28t-68 28l-136 136l-362 362q-28 28 -28 68t28 68l136 136q28 28 68 28t68 -28l294 -295l656 657q28 28 68 28t68 -28l136 -136q28 -28 28 -68z'),
+    'ebay': (1792, 'M1757 128l35 -313q3 -28 -16 -50q-19 -21 -48 -21h-1664q-29 0 -48 21q-19 22 -16 50l35 313h1722zM1664 967l86 -775h-1708l86 775q3 24 21 40.5t43 16.5h256v-128q0 -53 37.5 -90.5t90.5 -37.5t90.5 37.5t37.5 90.5v128h384v-128q0 -53 37.5 -90.5t90.5 -37.5 t90.5 37.5t37.5 90.5v128h256q25 0 43 -16.5t21 -40.5zM1280 1152v-256q0 -26 -19 -45t-45 -19t-45 19t-19 45v256q0 106 -75 181t-181 75t-181 -75t-75 -181v-256q0 -26 -19 -45t-45 -19t-45 19t-19 45v256q0 159 112.5 271.5t271.5 112.5t271.5 -112.5t112.5 -271.5z'),
+    'folder': (1664, 'M1664 928v-704q0 -92 -66 -158t-158 -66h-1216q-92 0 -158 66t-66 158v960q0 92 66 158t158 66h320q92 0 158 -66t66 -158v-32h672q92 0 158 -66t66 -158z'),
+    'folder-open': (1920, 'M1879 584q0 -31 -31 -66l-336 -396q-43 -51 -120.5 -86.5t-143.5 -35.5h-1088q-34 0 -60.5 13t-26.5 43q0 31 31 66l336 396q43 51 120.5 86.5t143.5 35.5h1088q34 0 60.5 -13t26.5 -43zM1536 928v-160h-832q-94 0 -197 -47.5t-164 -119.5l-337 -396l-5 -6q0 4 -0.5 12.5 t-0.5 12.5v960q0 92 66 158t158 66h320q92 0 158 -66t66 -158v-32h544q92 0 158 -66t66 -158z'),
+    'home': (1664, 'M1408 544v-480q0 -26 -19 -45t-45 -19h-384v384h-256v-384h-384q-26 0 -45 19t-19 45v480q0 1 0.5 3t0.5 3l575 474l575 -474q1 -2 1 -6zM1631 613l-62 -74q-8 -9 -21 -11h-3q-13 0 -21 7l-692 577l-692 -577q-12 -8 -24 -7q-13 2 -21 11l-62 74q-8 10 -7 23.5t11 21.5 l719 599q32 26 76 26t76 -26l244 -204v195q0 14 9 23t23 9h192q14 0 23 -9t9 -23v-408l219 -182q10 -8 11 -21.5t-7 -23.5z'),
+    'image': (1920, 'M640 960q0 -80 -56 -136t-136 -56t-136 56t-56 136t56 136t136 56t136 -56t56 -136zM1664 576v-448h-1408v192l320 320l160 -160l512 512zM1760 1280h-1600q-13 0 -22.5 -9.5t-9.5 -22.5v-1216q0 -13 9.5 -22.5t22.5 -9.5h1600q13 0 22.5 9.5t9.5 22.5v1216 q0 13 -9.5 22.5t-22.5 9.5zM1920 1248v-1216q0 -66 -47 -113t-113 -47h-1600q-66 0 -113 47t-47 113v1216q0 66 47 113t113 47h1600q66 0 113 -47t47 -113z'),
+    'layer-group': (1792, 'M1696 1152q40 0 68 -28t28 -68v-1216q0 -40 -28 -68t-68 -28h-960q-40 0 -68 28t-28 68v288h-544q-40 0 -68 28t-28 68v672q0 40 20 88t48 76l408 408q28 28 76 48t88 20h416q40 0 68 -28t28 -68v-328q68 40 128 40h416zM1152 939l-299 -299h299v299zM512 1323l-299 -299 h299v299zM708 676l316 316v416h-384v-416q0 -40 -28 -68t-68 -28h-416v-640h512v256q0 40 20 88t48 76zM1664 -128v1152h-384v-416q0 -40 -28 -68t-68 -28h-416v-640h896z'),
+    'list-check': (1792, 'M1024 128h640v128h-640v-128zM640 640h1024v128h-1024v-128zM1280 1152h384v128h-384v-128zM1792 320v-256q0 -26 -19 -45t-45 -19h-1664q-26 0 -45 19t-19 45v256q0 26 19 45t45 19h1664q26 0 45 -19t19 -45zM1792 832v-256q0 -26 -19 -45t-45 -19h-1664q-26 0 -45 19 t-19 45v256q0 26 19 45t45 19h1664q26 0 45 -19t19 -45zM1792 1344v-256q0 -26 -19 -45t-45 -19h-1664q-26 0 -45 19t-19 45v256q0 26 19 45t45 19h1664q26 0 45 -19t19 -45z'),
+    'magnifying-glass': (1664, 'M1152 704q0 185 -131.5 316.5t-316.5 131.5t-316.5 -131.5t-131.5 -316.5t131.5 -316.5t316.5 -131.5t316.5 131.5t131.5 316.5zM1664 -128q0 -52 -38 -90t-90 -38q-54 0 -90 38l-343 342q-179 -124 -399 -124q-143 0 -273.5 55.5t-225 150t-150 225t-55.5 273.5 t55.5 273.5t150 225t225 150t273.5 55.5t273.5 -55.5t225 -150t150 -225t55.5 -273.5q0 -220 -124 -399l343 -343q37 -37 37 -90z'),
+    'magnifying-glass-plus': (1664, 'M1024 736v-64q0 -13 -9.5 -22.5t-22.5 -9.5h-224v-224q0 -13 -9.5 -22.5t-22.5 -9.5h-64q-13 0 -22.5 9.5t-9.5 22.5v224h-224q-13 0 -22.5 9.5t-9.5 22.5v64q0 13 9.5 22.5t22.5 9.5h224v224q0 13 9.5 22.5t22.5 9.5h64q13 0 22.5 -9.5t9.5 -22.5v-224h224 q13 0 22.5 -9.5t9.5 -22.5zM1152 704q0 185 -131.5 316.5t-316.5 131.5t-316.5 -131.5t-131.5 -316.5t131.5 -316.5t316.5 -131.5t316.5 131.5t131.5 316.5zM1664 -128q0 -53 -37.5 -90.5t-90.5 -37.5q-54 0 -90 38l-343 342q-179 -124 -399 -124q-143 0 -273.5 55.5 t-225 150t-150 225t-55.5 273.5t55.5 273.5t150 225t225 150t273.5 55.5t273.5 -55.5t225 -150t150 -225t55.5 -273.5q0 -220 -124 -399l343 -343q37 -37 37 -90z'),
+    'tag': (1536, 'M448 1088q0 53 -37.5 90.5t-90.5 37.5t-90.5 -37.5t-37.5 -90.5t37.5 -90.5t90.5 -37.5t90.5 37.5t37.5 90.5zM1515 512q0 -53 -37 -90l-491 -492q-39 -37 -91 -37q-53 0 -90 37l-715 716q-38 37 -64.5 101t-26.5 117v416q0 52 38 90t90 38h416q53 0 117 -26.5t102 -64.5 l715 -714q37 -39 37 -91z'),
+    'trash': (1408, 'M512 160v704q0 14 -9 23t-23 9h-64q-14 0 -23 -9t-9 -23v-704q0 -14 9 -23t23 -9h64q14 0 23 9t9 23zM768 160v704q0 14 -9 23t-23 9h-64q-14 0 -23 -9t-9 -23v-704q0 -14 9 -23t23 -9h64q14 0 23 9t9 23zM1024 160v704q0 14 -9 23t-23 9h-64q-14 0 -23 -9t-9 -23v-704 q0 -14 9 -23t23 -9h64q14 0 23 9t9 23zM480 1152h448l-48 117q-7 9 -17 11h-317q-10 -2 -17 -11zM1408 1120v-64q0 -14 -9 -23t-23 -9h-96v-948q0 -83 -47 -143.5t-113 -60.5h-832q-66 0 -113 58.5t-47 141.5v952h-96q-14 0 -23 9t-9 23v64q0 14 9 23t23 9h309l70 167 q15 37 54 63t79 26h320q40 0 79 -26t54 -63l70 -167h309q14 0 23 -9t9 -23z'),
+    'trash-can': (1408, 'M512 800v-576q0 -14 -9 -23t-23 -9h-64q-14 0 -23 9t-9 23v576q0 14 9 23t23 9h64q14 0 23 -9t9 -23zM768 800v-576q0 -14 -9 -23t-23 -9h-64q-14 0 -23 9t-9 23v576q0 14 9 23t23 9h64q14 0 23 -9t9 -23zM1024 800v-576q0 -14 -9 -23t-23 -9h-64q-14 0 -23 9t-9 23v576 q0 14 9 23t23 9h64q14 0 23 -9t9 -23zM1152 76v948h-896v-948q0 -22 7 -40.5t14.5 -27t10.5 -8.5h832q3 0 10.5 8.5t14.5 27t7 40.5zM480 1152h448l-48 117q-7 9 -17 11h-317q-10 -2 -17 -11zM1408 1120v-64q0 -14 -9 -23t-23 -9h-96v-948q0 -83 -47 -143.5t-113 -60.5h-832 q-66 0 -113 58.5t-47 141.5v952h-96q-14 0 -23 9t-9 23v64q0 14 9 23t23 9h309l70 167q15 37 54 63t79 26h320q40 0 79 -26t54 -63l70 -167h309q14 0 23 -9t9 -23z'),
+    'xmark': (1408, 'M1298 214q0 -40 -28 -68l-136 -136q-28 -28 -68 -28t-68 28l-294 294l-294 -294q-28 -28 -68 -28t-68 28l-136 136q-28 28 -28 68t28 68l294 294l-294 294q-28 28 -28 68t28 68l136 136q28 28 68 28t68 -28l294 -294l294 294q28 28 68 28t68 -28l136 -136q28 -28 28 -68 t-28 -68l-294 -294l294 -294q28 -28 28 -68z'),
+}
+FA_ICONS['house'] = FA_ICONS['home']
+FA_STYLES = {'fa-solid', 'fa-regular', 'fa-brands'}
+
+# Tailwind's preflight (base reset), which the CDN script used to add
+TAILWIND_PREFLIGHT = """*,::before,::after{box-sizing:border-box;border-width:0;border-style:solid;border-color:#e5e7eb}
+html{line-height:1.5;-webkit-text-size-adjust:100%;tab-size:4;font-family:ui-sans-serif,system-ui,sans-serif,"Apple Color Emoji","Segoe UI Emoji";-webkit-tap-highlight-color:transparent}
+body{margin:0;line-height:inherit}
+hr{height:0;color:inherit;border-top-width:1px}
+h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}
+a{color:inherit;text-decoration:inherit}
+b,strong{font-weight:bolder}
+code,kbd,samp,pre{font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,"Liberation Mono","Courier New",monospace;font-size:1em}
+small{font-size:80%}
+button,input,optgroup,select,textarea{font-family:inherit;font-size:100%;font-weight:inherit;line-height:inherit;letter-spacing:inherit;color:inherit;margin:0;padding:0}
+button,select{text-transform:none}
+button,[type=button],[type=reset],[type=submit]{-webkit-appearance:button;background-color:transparent;background-image:none}
+[type=search]{-webkit-appearance:textfield;outline-offset:-2px}
+::-webkit-search-decoration{-webkit-appearance:none}
+blockquote,dl,dd,h1,h2,h3,h4,h5,h6,hr,figure,p,pre{margin:0}
+ol,ul,menu{list-style:none;margin:0;padding:0}
+input::placeholder,textarea::placeholder{opacity:1;color:#9ca3af}
+button,[role=button]{cursor:pointer}
+:disabled{cursor:default}
+img,svg,video,canvas,audio,iframe,embed,object{display:block;vertical-align:middle}
+img,video{max-width:100%;height:auto}
+[hidden]{display:none}"""
+
+def tailwind_spacing(value):
+    # 4 -> 1rem; also px, auto, full and arbitrary [12rem]
+    if value.startswith('[') and value.endswith(']'): return value[1:-1]
+    if value == 'px': return '1px'
+    if value in ('auto', 'full'): return 'auto' if value == 'auto' else '100%'
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return '0px' if number == 0 else f"{number / 4:g}rem"
+
+def tailwind_color(value):
+    # (r, g, b) for "gray-200", "white", "black"
+    if value == 'white': return (255, 255, 255)
+    if value == 'black': return (0, 0, 0)
+    family, _, shade = value.rpartition('-')
+    hex_value = TAILWIND_COLORS.get(family, {}).get(int(shade)) if shade.isdigit() else None
+    return tuple(bytes.fromhex(hex_value)) if hex_value else None
+
+def tailwind_rule(name):
+    # Returns (order, selector suffix, declarations) for one utility without its variants, or None.
+    # Colour utilities read an opacity variable so bg-opacity-60 and friends keep working.
+    # Utilities that take a value are slotted in just after a static one from the same Tailwind group
+    if name in TAILWIND_STATIC:
+        return TAILWIND_STATIC_ORDER[name], '', TAILWIND_STATIC[name]
+    def order_after(static_name): return TAILWIND_STATIC_ORDER[static_name] + 5
+    if name == 'container':
+        return -10, '', 'width:100%'
+    if name in TAILWIND_SHADOWS:
+        return 1000, '', f"box-shadow:{TAILWIND_SHADOWS[name]}"
+    if name in TAILWIND_TRANSITIONS:
+        return 1010, '', f"transition-property:{TAILWIND_TRANSITIONS[name]};transition-timing-function:cubic-bezier(.4,0,.2,1);transition-duration:150ms"
+
+    match = re.fullmatch(r'(top|right|bottom|left|inset)-(.+)', name)
+    if match and tailwind_spacing(match.group(2)):
+        return order_after('sticky'), '', f"{match.group(1)}:{tailwind_spacing(match.group(2))}"
+    match = re.fullmatch(r'z-(\d+|\[\d+\])', name)
+    if match:
+        return order_after('sticky') + 1, '', f"z-index:{match.group(1).strip('[]')}"
+    match = re.fullmatch(r'(-?)(m|p)([xytrbl]?)-(.+)', name)
+    if match and tailwind_spacing(match.group(4)) and not (match.group(1) and match.group(2) == 'p'):
+        sign, kind, side, value = match.groups()
+        size = ('-' if sign else '') + tailwind_spacing(value)
+        prop = 'margin' if kind == 'm' else 'padding'
+        order = order_after('mx-auto' if kind == 'm' else 'object-cover') + (0 if not side else 1 if side in 'xy' else 2)  # p, then px, then pb
+        return order, '', ';'.join(f"{prop}{suffix}:{size}" for suffix in TAILWIND_SPACING_SIDES[side])
+    match = re.fullmatch(r'(h|w|min-h|max-h|min-w)-(.+)', name)
+    if match:
+        value = {'screen': '100vh' if 'h' in match.group(1) else '100vw'}.get(match.group(2)) or tailwind_spacing(match.group(2))
+        prop = {'h': 'height', 'w': 'width', 'min-h': 'min-height', 'max-h': 'max-height', 'min-w': 'min-width'}[match.group(1)]
+        if value: return order_after('hidden') + ['h', 'max-h', 'min-h', 'w', 'min-w'].index(match.group(1)), '', f"{prop}:{value}"
+    match = re.fullmatch(r'max-w-(.+)', name)
+    if match and match.group(1) in TAILWIND_MAX_WIDTHS:
+        return order_after('hidden') + 5, '', f"max-width:{TAILWIND_MAX_WIDTHS[match.group(1)]}"
+    match = re.fullmatch(r'scale-(\d+)', name)
+    if match:
+        return order_after('shrink-0'), '', f"transform:scale({int(match.group(1)) / 100:g})"
+    match = re.fullmatch(r'grid-cols-(\d+)', name)
+    if match:
+        return order_after('list-disc'), '', f"grid-template-columns:repeat({match.group(1)},minmax(0,1fr))"
+    match = re.fullmatch(r'gap-(.+)', name)
+    if match and tailwind_spacing(match.group(1)):
+        return order_after('justify-between'), '', f"gap:{tailwind_spacing(match.group(1))}"
+    match = re.fullmatch(r'space-(x|y)-(.+)', name)
+    if match and tailwind_spacing(match.group(2)):
+        side = 'left' if match.group(1) == 'x' else 'top'
+        return order_after('justify-between') + 1, ' > :not([hidden]) ~ :not([hidden])', f"margin-{side}:{tailwind_spacing(match.group(2))}"
+    match = re.fullmatch(r'border(-[trbl])?(-\d+)?', name)
+    if match:
+        side = {'-t': 'top', '-r': 'right', '-b': 'bottom', '-l': 'left'}.get(match.group(1))
+        width = f"{match.group(2)[1:]}px" if match.group(2) else '1px'
+        return order_after('rounded-full') + (1 if side else 0), '', f"border-{side}-width:{width}" if side else f"border-width:{width}"
+    match = re.fullmatch(r'(bg|text|border)-opacity-(\d+)', name)
+    if match:
+        return {'bg': 910, 'text': 930, 'border': 890}[match.group(1)], '', f"--tw-{match.group(1)}-opacity:{int(match.group(2)) / 100:g}"
+    match = re.fullmatch(r'(bg|text|border)-(.+)', name)
+    if match and tailwind_color(match.group(2)):
+        r, g, b = tailwind_color(match.group(2))
+        kind = match.group(1)
+        prop = {'bg': 'background-color', 'text': 'color', 'border': 'border-color'}[kind]
+        return {'bg': 900, 'text': 920, 'border': 880}[kind], '', f"--tw-{kind}-opacity:1;{prop}:rgb({r} {g} {b}/var(--tw-{kind}-opacity))"
+    match = re.fullmatch(r'text-(.+)', name)
+    if match and match.group(1) in TAILWIND_FONT_SIZES:
+        size, line_height = TAILWIND_FONT_SIZES[match.group(1)]
+        return order_after('font-mono'), '', f"font-size:{size};line-height:{line_height}"
+    match = re.fullmatch(r'opacity-(\d+)', name)
+    if match:
+        return 990, '', f"opacity:{int(match.group(1)) / 100:g}"
+    match = re.fullmatch(r'duration-(\d+)', name)
+    if match:
+        return 1020, '', f"transition-duration:{match.group(1)}ms"
+    return None
+
+def css_escape(class_name):
+    return re.sub(r'([:\[\]/.%#])', r'\\\1', class_name)
+
+def icon_css(icons, styles):
+    # Each icon is its outline as a mask over currentColor, so text colour and size classes work as they did on the font
+    css = []
+    if styles:
+        css.append(f"{','.join('.' + style for style in sorted(styles))}{{display:inline-block;font-style:normal;line-height:1}}")
+    if icons:
+        css.append(f"{','.join(f'.fa-{icon}::before' for icon in sorted(icons))}{{content:\"\";display:inline-block;width:var(--fa-width);"
+                   "height:1em;vertical-align:-.125em;background-color:currentColor;"
+                   "-webkit-mask:var(--fa-icon) center/contain no-repeat;mask:var(--fa-icon) center/contain no-repeat}")
+    for icon in sorted(icons):
+        width, path = FA_ICONS[icon]
+        svg = (f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 -{FA_ASCENT} {width} {FA_UNITS_PER_EM}'>"
+               f"<path transform='scale(1 -1)' d='{path}'/></svg>").replace('<', '%3C').replace('>', '%3E')
+        css.append(f'.fa-{icon}{{--fa-width:{width / FA_UNITS_PER_EM:.4g}em;--fa-icon:url("data:image/svg+xml,{svg}")}}')
+    return css
+
+def template_classes(template):
+    # Class names the template actually sets (class="...", className = ..., classList calls), with ${...} conditions
+    # dropped, and the ones its own <style> blocks or querySelector calls already give a meaning
+    used, known = set(), {'group'}
+    for match in re.finditer(r'''class(?:Name)?\s*=\s*(["'`])(.*?)\1|classList\.\w+\(([^)]*)\)''', template, re.S):
+        text = match.group(2) if match.group(2) is not None else ' '.join(re.findall(r"'([^']*)'", match.group(3)))
+        text = re.sub(r'\$\{\s*[\w.]+', ' ', text)
+        used.update(re.findall(r'-?[a-z][\w:\-\[\]./%#]*', text))
+    for block in re.findall(r'<style>(.*?)</style>', template, re.S):
+        known.update(re.findall(r'\.(-?[a-zA-Z][\w-]*)', re.sub(r'\{[^{}]*\}', '', block)))
+    known.update(re.findall(r'''querySelector(?:All)?\(['"]\.([\w-]+)''', template))
+    return used, known
+
+def compile_stylesheet(template):
+    # Tailwind-style content scan: every word that could be a class, then keep the ones we can build
+    rules, icons, styles, unknown_icons = [], set(), set(), set()
+    for candidate in set(re.findall(r'[\w:\-\[\]./%#]+', template)):
+        if candidate in FA_STYLES:
+            styles.add(candidate)
+            continue
+        if candidate.startswith('fa-'):
+            if candidate[3:] in FA_ICONS: icons.add(candidate[3:])
+            elif re.fullmatch(r'fa-[a-z0-9-]+', candidate): unknown_icons.add(candidate)
+            continue
+        *variants, utility = candidate.split(':')
+        if len(variants) > 2 or not all(v in TAILWIND_SCREENS or v in ('hover', 'focus', 'group-hover') for v in variants):
+            continue
+        rule = tailwind_rule(utility)
+        if rule is None: continue
+        order, suffix, declarations = rule
+        screen = next((TAILWIND_SCREENS[v] for v in variants if v in TAILWIND_SCREENS), 0)
+        state = next((v for v in variants if v not in TAILWIND_SCREENS), None)
+        selector = f".{css_escape(candidate)}"
+        if state == 'group-hover':
+            selector = f".group:hover {selector}"
+        elif state:
+            selector += f":{state}"
+        rules.append((screen, state is not None, order, candidate, f"{selector}{suffix}{{{declarations}}}"))
+
+    # Same cascade as Tailwind: plain utilities, then hover/focus, then each breakpoint in turn
+    css = [TAILWIND_PREFLIGHT]
+    css += icon_css(icons, styles)
+    has_container = any(rule[3] == 'container' for rule in rules)
+    screens = {rule[0] for rule in rules} | (set(TAILWIND_SCREENS.values()) if has_container else set())
+    for screen in sorted(screens | {0}):
+        block = [rule[4] for rule in sorted(rule for rule in rules if rule[0] == screen)]
+        if screen and has_container:
+            block.insert(0, f".container{{max-width:{screen}px}}")
+        if screen:
+            css.append(f"@media (min-width:{screen}px){{{''.join(block)}}}")
+        else:
+            css.extend(block)
+    for icon in sorted(unknown_icons):
+        print(f"⚠️ No outline for icon {icon}, add it to FA_ICONS")
+    built = {rule[3] for rule in rules} | FA_STYLES | {f"fa-{icon}" for icon in icons} | unknown_icons
+    used, known = template_classes(template)
+    for name in sorted(used - built - known):
+        print(f"⚠️ No style for class {name}, it isn't a utility compile_stylesheet knows")
+    return "\n".join(css)
+
+STYLESHEET = None
+
+def page_stylesheet():
+    # HTML_TEMPLATE doesn't change between builds, so compile once per run
+    global STYLESHEET
+    if STYLESHEET is None:
+        STYLESHEET = compile_stylesheet(HTML_TEMPLATE)
+    return STYLESHEET
+
+def render_page(inventory_structure, compact=False, search_index=None):
+    # search_index: the index itself to inline, a URL the page fetches it from, or None for no search box
+    if compact:
+        inventory_js = f"unpackInventory({serialize_inventory([inventory_structure], compact=True)})[0]"
+    else:
+        inventory_js = serialize_inventory(inventory_structure, compact=False)
+    search_js = json.dumps(search_index, separators=(',', ':'), ensure_ascii=False)
+    page = HTML_TEMPLATE.replace("{STYLESHEET_PLACEHOLDER}", page_stylesheet()).replace("{SERVICE_WORKER_FILE}", SERVICE_WORKER_FILE)
+    return page.replace("{INVENTORY_PLACEHOLDER}", inventory_js).replace("{SEARCH_PLACEHOLDER}", search_js)
+
+def report_unpriced(base_path, unpriced):
+    # Lots with no price in their filename show as $0.00 in the shop, list them so they can be renamed
+    print("--- Price Report ---")
+    report_path = os.path.join(base_path, PRICE_REPORT_FILE)
+    if not unpriced:
+        print("   Every image has a price in its filename.")
+        if os.path.exists(report_path): os.remove(report_path)
+        return
+    print(f"⚠️ {len(unpriced)} images have no price in their filename (they show as $0.00):")
+    for web_path in unpriced[:20]:
+        print(f"   - {web_path}")
+    if len(unpriced) > 20:
+        print(f"   ... and {len(unpriced) - 20} more, see {PRICE_REPORT_FILE}")
+    write_if_changed(base_path, PRICE_REPORT_FILE, "\n".join(unpriced) + "\n")
+
+def new_changes():
+    # What a build touched: lots (image paths) added/removed/changed, and generated files written or deleted
+    return {"added": [], "removed": [], "changed": [], "outputs": set()}
+
+def merge_changes(changes, other):
+    for key in ("added", "removed", "changed"):
+        changes[key].extend(other[key])
+    changes["outputs"] |= other["outputs"]
+
+def changed_paths(changes):
+    return sorted(set(changes["added"]) | set(changes["removed"]) | set(changes["changed"]) | changes["outputs"])
+
+def load_pending_push(base_path):
+    pending = new_changes()
+    try:
+        with open(os.path.join(base_path, PENDING_PUSH_FILE), 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        for key in ("added", "removed", "changed"):
+            pending[key] = list(saved[key])
+        pending["outputs"] = set(saved["outputs"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return pending
+
+def record_pending_push(base_path, changes):
+    # The build manifest is saved before anything is uploaded, so after an upload that didn't finish (no remote,
+    # no network, a crash) the next build would see nothing new. Whatever isn't pushed yet is kept on disk instead.
+    pending = load_pending_push(base_path)
+    merge_changes(pending, changes)
+    saved = {key: sorted(set(pending[key])) for key in ("added", "removed", "changed", "outputs")}
+    try:
+        write_if_changed(base_path, PENDING_PUSH_FILE, json.dumps(saved, indent=4))
+    except OSError as e:
+        print(f"⚠️ Could not save the list of files to upload: {e}")
+    return pending
+
+# --- PROFILING ---
+# While --profile is on, PROFILE holds what the run measured. When it's off PROFILE stays None and the
+# only cost is one "is None" check per phase and per git command, nothing per folder or file.
+PROFILE = None
+PROFILE_LOCK = threading.Lock()
+NO_PROFILE = contextlib.nullcontext()
+
+def profile_phase(name):
+    if PROFILE is None: return NO_PROFILE
+    return timed_phase(name)
+
+@contextlib.contextmanager
+def timed_phase(name):
+    # CPU time is this process only (all threads); the thumbnail workers and git run in other processes
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        phase = PROFILE["phases"].setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "runs": 0})
+        phase["wall_seconds"] += time.perf_counter() - wall
+        phase["cpu_seconds"] += time.process_time() - cpu
+        phase["runs"] += 1
+
+def profile_count(name, n):
+    if PROFILE is None: return
+    with PROFILE_LOCK:
+        PROFILE["counts"][name] = PROFILE["counts"].get(name, 0) + n
+
+def counting(name, func):
+    def wrapper(*args, **kwargs):
+        profile_count(name, 1)
+        return func(*args, **kwargs)
+    return wrapper
+
+def start_profile(use_cprofile=False):
+    # Swaps in counting versions of os.stat, os.scandir and hash_file for the length of the run,
+    # so the normal code path never carries counters. Returns what finish_profile needs to undo it.
+    global PROFILE, hash_file
+    PROFILE = {"phases": {}, "counts": {}, "subprocesses": [], "outputs": {}}
+    originals = {"stat": os.stat, "scandir": os.scandir, "hash_file": hash_file}
+    os.stat = counting("stat_calls", os.stat)
+    os.scandir = counting("scandir_calls", os.scandir)
+    hash_file = counting("files_hashed", hash_file)
+    profiler = None
+    if use_cprofile:
+        profiler = cProfile.Profile()  # Only sees the main thread
+        profiler.enable()
+    return originals, profiler, time.perf_counter(), time.process_time()
+
+def output_sizes(base_path):
+    sizes = {}
+    for rel_path in ('index.html', SERVICE_WORKER_FILE, MANIFEST_FILE, PRICE_REPORT_FILE):
+        try:
+            sizes[rel_path.replace("\\", "/")] = os.path.getsize(os.path.join(base_path, rel_path))
+        except OSError:
+            pass
+    try:
+        with os.scandir(os.path.join(base_path, INVENTORY_DIR)) as it:
+            shard_sizes = [item.stat().st_size for item in it if item.name.endswith('.json')]
+        sizes[f"{INVENTORY_DIR}/ ({len(shard_sizes)} files)"] = sum(shard_sizes)
+    except OSError:
+        pass
+    return sizes
+
+def finish_profile(base_path, started):
+    global PROFILE, hash_file
+    originals, profiler, wall, cpu = started
+    if profiler:
+        profiler.disable()
+    os.stat, os.scandir, hash_file = originals["stat"], originals["scandir"], originals["hash_file"]
+    report, PROFILE = PROFILE, None
+    report["total"] = {"wall_seconds": time.perf_counter() - wall, "cpu_seconds": time.process_time() - cpu}
+    report["outputs"] = output_sizes(base_path)
+
+    print("\n--- Profile ---")
+    for name, phase in report["phases"].items():
+        print(f"   {name:<14} {phase['wall_seconds']:>8.3f}s wall  {phase['cpu_seconds']:>8.3f}s cpu")
+    git_seconds = sum(run["seconds"] for run in report["subprocesses"])
+    print(f"   {'total':<14} {report['total']['wall_seconds']:>8.3f}s wall  {report['total']['cpu_seconds']:>8.3f}s cpu"
+          f"  ({len(report['subprocesses'])} git commands, {git_seconds:.3f}s)")
+    print("   " + ", ".join(f"{name} {n}" for name, n in report["counts"].items()))
+    try:
+        write_if_changed(base_path, PROFILE_FILE, json.dumps(report, indent=4))
+        print(f"✅ Profile saved to {PROFILE_FILE}")
+        if profiler:
+            profiler.dump_stats(os.path.join(base_path, PROFILE_STATS_FILE))
+            print(f"✅ cProfile stats saved to {PROFILE_STATS_FILE}")
+    except OSError as e:
+        print(f"⚠️ Could not save profile: {e}")
+
+def generate_and_update(sharded=SHARDED_INVENTORY, compact=COMPACT_INVENTORY, fix_filenames=FIX_FILENAMES,
+                        optimize=OPTIMIZE_ORIGINALS, duplicates=FIND_DUPLICATES, placeholders=PLACEHOLDERS, precompress=PRECOMPRESS_ARTIFACTS,
+                        dirty=None, preview=None):
+    # Returns the build's changes (see new_changes), or None if it failed.
+    # preview: serve mode's state between rebuilds. Generated text files end up in changes["memory"] instead of on
+    # disk (thumbnails are still rendered into derived/, they're too big to hold in memory), and the manifest is
+    # kept in preview["manifest"] rather than saved, so the next real build still uploads everything that changed
+    # since the last upload.
+    changes = new_changes()
+    if preview is not None:
+        changes["memory"] = {}
 
-def generate_and_update():
     # 1. Scan
     print("--- Scanning Inventory ---")
-    contents, total_files, total_folders = scan_directory(SCRIPT_DIR)
+    manifest = (preview or {}).get("manifest") or load_manifest(SCRIPT_DIR)
+    state = new_scan_state(manifest, dirty, fix_filenames)
+    with profile_phase("scan"), ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        contents, totals = scan_directory(SCRIPT_DIR, state=state, pool=pool)
+    profile_count("folders", len(state["dirs"]))
+    profile_count("folders_reread", state["rescanned"])
+    profile_count("files", totals["total_files"])
+    print(f"   Re-read {state['rescanned']} of {len(state['dirs'])} folders (others unchanged since last run).")
+    if fix_filenames:
+        # Same pass as the scan: the inventory above already uses the new names
+        with profile_phase("rename"):
+            apply_renames(SCRIPT_DIR, state)
+    manifest["dirs"] = changes["dirs"] = state["dirs"]  # Also returned, so watch mode can poll them without the manifest
+    report_unpriced(SCRIPT_DIR, state["unpriced"])
     inventory_structure = { 
         "name": "Home", 
         "type": "folder", 
         "contents": contents,
-        "total_files": total_files,
-        "total_folders": total_folders
+        **totals
     }
     
+    # Derivatives: a new or reset cache index also gets a full sweep of the derived folder
+    sweep = "derived" not in manifest
+    with profile_phase("hash"):
+        hashes = hash_sources(SCRIPT_DIR, inventory_structure, manifest, changes, dirty)
+    if optimize:
+        with profile_phase("optimize"):
+            optimize_originals(SCRIPT_DIR, manifest, hashes, changes)
+    # After optimizing, so each lot's saved version is the hash of the file as it now is
+    # Previews build on their own last map, so a new lot keeps its id from one preview rebuild to the next
+    lot_ids = assign_lot_ids(inventory_structure, (preview or {}).get("lot_ids") or load_lot_ids(SCRIPT_DIR, manifest), hashes)
+    manifest.pop("lot_ids", None)
+    if preview is not None:
+        preview["lot_ids"] = lot_ids
+    try:
+        save_lot_ids(SCRIPT_DIR, lot_ids, changes)
+    except OSError as e:
+        print(f"❌ Could not save {LOT_IDS_FILE}, carts may point at the wrong lots after the next build: {e}")
+        return None
+    with profile_phase("dimensions"):
+        read_dimensions(SCRIPT_DIR, inventory_structure, manifest, hashes)
+    with profile_phase("thumbnails"):
+        generate_thumbnails(SCRIPT_DIR, inventory_structure, manifest, hashes, changes)
+    if placeholders:
+        with profile_phase("placeholders"):
+            generate_placeholders(SCRIPT_DIR, inventory_structure, manifest, hashes)
+    if duplicates:
+        with profile_phase("duplicates"):
+            find_duplicates(SCRIPT_DIR, inventory_structure, manifest, hashes)
+    if preview is not None:
+        # Nothing is deleted while previewing, the next real build evicts
+        preview["manifest"] = manifest
+    else:
+        with profile_phase("evict"):
+            evict_derivatives(SCRIPT_DIR, manifest, set(hashes.values()), changes, sweep=sweep)
+        record_pending_push(SCRIPT_DIR, changes)
+        try:
+            with profile_phase("manifest"):
+                save_manifest(SCRIPT_DIR, manifest)
+        except OSError as e:
+            print(f"⚠️ Could not save build manifest: {e}")
+
     # 2. Inject into Template
-    inventory_json = json.dumps(inventory_structure, indent=4)
-    final_html = HTML_TEMPLATE.replace("{INVENTORY_PLACEHOLDER}", inventory_json)
+    with profile_phase("search_index"):
+        search_index = build_search_index(inventory_structure)
+    with profile_phase("render"):
+        final_html = render_inventory(inventory_structure, changes, sharded, compact, search_index)
+    if final_html is None:
+        return None
     
     # 3. Write index.html
     try:
-        with open(os.path.join(SCRIPT_DIR, 'index.html'), 'w', encoding='utf-8') as f:
-            f.write(final_html)
-        print("✅ SUCCESS: Rebuilt index.html with new inventory and header.")
+        with profile_phase("write"):
+            written = write_if_changed(SCRIPT_DIR, 'index.html', final_html, changes)
+        if preview is not None:
+            print("✅ SUCCESS: Rebuilt the preview in memory.")
+        elif written:
+            print("✅ SUCCESS: Rebuilt index.html with new inventory and header.")
+        else:
+            print("✅ SUCCESS: index.html is already up to date.")
+        write_service_worker(SCRIPT_DIR, final_html, changes)
     except Exception as e:
         print(f"❌ Error writing file: {e}")
-        return False
-    return True
+        return None
+    if precompress and preview is None:
+        with profile_phase("compress"):
+            precompress_artifacts(SCRIPT_DIR, text_artifacts(SCRIPT_DIR), changes)
+    if preview is None:
+        record_pending_push(SCRIPT_DIR, changes)
+    return changes
+
+def write_service_worker(base_path, final_html, changes):
+    shell_version = hashlib.blake2b(final_html.encode('utf-8'), digest_size=8).hexdigest()
+    worker = SW_TEMPLATE.replace("{SHELL_VERSION}", shell_version).replace("{IMAGE_CACHE_LIMIT}", str(SW_IMAGE_CACHE_LIMIT))
+    worker = worker.replace("{ORIGINAL_CACHE_LIMIT}", str(SW_ORIGINAL_CACHE_LIMIT))
+    write_if_changed(base_path, SERVICE_WORKER_FILE, worker, changes)
+
+def compressed_suffixes():
+    return ('.gz', '.br') if brotli is not None else ('.gz',)
 
-def push_to_github():
+def compress_artifact(path, suffixes):
+    # Runs in a worker thread (zlib and brotli do their work outside the GIL). gzip's header timestamp
+    # is zeroed so the same input always gives the same bytes and git sees no change.
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for suffix in suffixes:
+            body = gzip.compress(data, compresslevel=9, mtime=0) if suffix == '.gz' else brotli.compress(data, quality=11)
+            tmp_path = path + suffix + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path + suffix)
+    except OSError as e:
+        return str(e)
+    return None
+
+def precompress_artifacts(base_path, rel_paths, changes):
+    print("--- Compressing Artifacts ---")
+    suffixes = compressed_suffixes()
+    # Only files this build rewrote, or whose compressed copies are missing
+    jobs = [rel_path for rel_path in rel_paths
+            if rel_path in changes["outputs"] or not all(os.path.exists(os.path.join(base_path, rel_path + suffix)) for suffix in suffixes)]
+    failed = 0
+    if jobs:
+        with ThreadPoolExecutor(max_workers=COMPRESS_WORKERS) as pool:
+            for rel_path, error in zip(jobs, pool.map(lambda rel_path: compress_artifact(os.path.join(base_path, rel_path), suffixes), jobs)):
+                if error:
+                    print(f"❌ Could not compress {rel_path}: {error}")
+                    failed += 1
+                    continue
+                changes["outputs"].update(rel_path + suffix for suffix in suffixes)
+                if brotli is None and os.path.exists(os.path.join(base_path, rel_path + '.br')):
+                    os.remove(os.path.join(base_path, rel_path + '.br'))  # Would no longer match its source
+                    changes["outputs"].add(rel_path + '.br')
+    print(f"   Compressed {len(jobs) - failed} changed files, {len(rel_paths) - len(jobs)} unchanged."
+          + ("" if brotli is not None else " (no .br: pip install brotli)"))
+
+    # Sizes of everything a buyer's browser may download, raw and compressed
+    sizes = {}
+    for rel_path in rel_paths:
+        try:
+            sizes[rel_path] = {"raw": os.path.getsize(os.path.join(base_path, rel_path))}
+            for suffix in suffixes:
+                sizes[rel_path][suffix[1:]] = os.path.getsize(os.path.join(base_path, rel_path + suffix))
+        except OSError:
+            pass
+    write_if_changed(base_path, ARTIFACT_SIZES_FILE, json.dumps(sizes, indent=4))
+    # Shards are summed into one line, there can be thousands of them
+    is_shard = lambda rel_path: rel_path.startswith(f"{INVENTORY_DIR}/") and rel_path != SEARCH_INDEX_FILE
+    shards = [size for rel_path, size in sizes.items() if is_shard(rel_path)]
+    for rel_path, size in sizes.items():
+        if is_shard(rel_path): continue
+        print(f"   {rel_path:<24} " + "  ".join(f"{name} {value:>10,}" for name, value in size.items()))
+    if shards:
+        totals = {name: sum(size.get(name, 0) for size in shards) for name in shards[0]}
+        print(f"   {f'{INVENTORY_DIR}/ ({len(shards)} shards)':<24} " + "  ".join(f"{name} {value:>10,}" for name, value in totals.items()))
+
+def text_artifacts(base_path):
+    # Generated files the page fetches, as "/"-separated paths
+    rel_paths = ['index.html', SERVICE_WORKER_FILE]
+    with os.scandir(os.path.join(base_path, INVENTORY_DIR)) as it:
+        rel_paths += sorted(f"{INVENTORY_DIR}/{item.name}" for item in it if item.name.endswith('.json'))
+    return rel_paths
+
+def render_inventory(inventory_structure, changes, sharded, compact, search_index):
+    # The finished index.html; sharded builds also write their folder shards here. None if that failed.
+    if sharded:
+        shards = {}
+        root = dict(inventory_structure, contents=split_into_shards(inventory_structure, "", shards))
+        try:
+            written = write_shards(SCRIPT_DIR, shards, changes, compact, search_index)
+        except OSError as e:
+            print(f"❌ Error writing inventory shards: {e}")
+            return None
+        print(f"   Updated {written} of {len(shards) + 1} folder shards and search index files in {INVENTORY_DIR}/.")
+        return render_page(root, compact, SEARCH_INDEX_FILE)
+    # The search index is its own file in every layout, fetched the first time it's needed
+    try:
+        write_shards(SCRIPT_DIR, {}, changes, search_index=search_index)  # Also clears out shards left by an earlier sharded build
+    except OSError as e:
+        print(f"❌ Error writing the search index: {e}")
+        return None
+    return render_page(inventory_structure, compact, SEARCH_INDEX_FILE)
+
+def run_git(*args, **kwargs):
+    if PROFILE is None:
+        return subprocess.run(["git", *args], cwd=SCRIPT_DIR, **kwargs)
+    start = time.perf_counter()
+    try:
+        return subprocess.run(["git", *args], cwd=SCRIPT_DIR, **kwargs)
+    finally:
+        PROFILE["subprocesses"].append({"command": f"git {args[0]}", "seconds": time.perf_counter() - start})
+
+def commit_message(changes):
+    # Subject sums up the lots, body lists them (capped so a big import doesn't make a huge message)
+    added, removed, changed = changes["added"], changes["removed"], changes["changed"]
+    parts = [f"{len(paths)} {label}" for paths, label in ((added, "added"), (removed, "removed"), (changed, "updated")) if paths]
+    subject = f"Inventory update: {', '.join(parts)}" if parts else "Auto-update"
+    lines = [f"{mark} {path}" for paths, mark in ((added, "+"), (removed, "-"), (changed, "~")) for path in paths]
+    if len(lines) > 50:
+        lines = lines[:50] + [f"... and {len(lines) - 50} more"]
+    return subject + ("\n\n" + "\n".join(lines) if lines else "") + "\n"
+
+def push_to_github(changes):
     print("\n--- Uploading to GitHub ---")
+    # Only the paths this build added, removed or rewrote are handed to git, so it never has to
+    # stat the whole image tree the way "git add ." / "git status" do. Paths from earlier builds
+    # whose upload didn't finish go along.
+    changes = record_pending_push(SCRIPT_DIR, changes)
+    paths = changed_paths(changes)
+    if not paths:
+        print("   No changes to upload.")
+        return
     try:
         # Check if remote exists
-        remote_check = subprocess.run(["git", "remote", "-v"], capture_output=True, text=True, cwd=SCRIPT_DIR)
+        remote_check = run_git("remote", "-v", capture_output=True, text=True)
         if not remote_check.stdout:
              print("❌ Error: No remote repository configured. Please run 'git remote add origin <URL>' manually first.")
              return
 
         # Ensure we are on main branch
-        subprocess.run(["git", "branch", "-M", "main"], check=True, cwd=SCRIPT_DIR)
+        branch = run_git("symbolic-ref", "--short", "-q", "HEAD", capture_output=True, text=True)
+        if branch.stdout.strip() != "main":
+            run_git("branch", "-M", "main", check=True)
         
-        # Add all files
-        subprocess.run(["git", "add", "."], check=True, cwd=SCRIPT_DIR)
+        # Stage exactly these paths: new/changed files are added, missing ones removed from the index
+        run_git("update-index", "--add", "--remove", "-z", "--stdin", input="\0".join(paths) + "\0", text=True, check=True)
         
-        status = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, cwd=SCRIPT_DIR)
-        if not status.stdout.strip():
-            print("   No changes to upload.")
-            return
-
-        subprocess.run(["git", "commit", "-m", "Auto-update"], check=True, cwd=SCRIPT_DIR)
-        subprocess.run(["git", "push", "-u", "origin", "main"], check=True, cwd=SCRIPT_DIR)
-        print("\n✅ DONE! Website updated.")
+        # Compares the index with HEAD only, no working tree scan. Nothing staged can still mean an
+        # earlier commit never got pushed, so push either way.
+        if run_git("diff", "--cached", "--quiet").returncode != 0:
+            run_git("commit", "-q", "-F", "-", input=commit_message(changes), text=True, check=True)
+        run_git("push", "-u", "origin", "main", check=True)
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(SCRIPT_DIR, PENDING_PUSH_FILE))
+        print(f"\n✅ DONE! Website updated ({len(paths)} files).")
     except subprocess.CalledProcessError as e:
         print(f"\n❌ Git Error: {e}")
 
+# --- WATCH MODE ---
+# A watcher is a pair of functions: wait(timeout) -> True once something relevant changed,
+# and take_dirty() -> the folders (relative, "/"-separated) changed since the last call, or None if unknown.
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x002, 0x004, 0x008
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x040, 0x080, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_ISDIR = 0x400, 0x800, 0x4000, 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+def is_watched_name(parent, name):
+    # Our own output (index.html, sw.js and their compressed copies, cache, derived files, temp files)
+    # must not trigger another rebuild
+    if name in IGNORE_LIST or name.endswith('.tmp'): return False
+    if not parent and name.startswith(('index.html', SERVICE_WORKER_FILE)): return False
+    return bool(parent) or name not in GENERATED_DIRS
+
+def inotify_watcher(base_path):
+    if not sys.platform.startswith('linux'): return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0: return None
+
+    watches = {}
+    dirty = set()
+    state = {"overflow": False}
+
+    def add_tree(rel_path):
+        # One watch per folder; returns False when the kernel's watch limit is reached
+        wd = libc.inotify_add_watch(fd, os.fsencode(os.path.join(base_path, rel_path)), INOTIFY_MASK)
+        if wd < 0: return ctypes.get_errno() != 28  # ENOSPC: out of watches, anything else is a vanished folder
+        watches[wd] = rel_path
+        try:
+            with os.scandir(os.path.join(base_path, rel_path)) as it:
+                subdirs = [entry.name for entry in it if entry.is_dir() and is_watched_name(rel_path, entry.name)]
+        except OSError:
+            return True
+        return all(add_tree(f"{rel_path}/{name}" if rel_path else name) for name in subdirs)
+
+    if not add_tree(""):
+        os.close(fd)
+        print("⚠️ Too many folders for inotify (raise fs.inotify.max_user_watches), falling back to polling.")
+        return None
+
+    def wait(timeout):
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if not ready: return False
+        data = os.read(fd, 64 * 1024)
+        changed = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+            name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b'\0'))
+            offset += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                state["overflow"] = changed = True
+                continue
+            parent = watches.get(wd)
+            if parent is None or (name and not is_watched_name(parent, name)): continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                add_tree(f"{parent}/{name}" if parent else name)
+            dirty.add(parent)
+            changed = True
+        return changed
+
+    def take_dirty():
+        result = None if state["overflow"] else set(dirty)
+        dirty.clear()
+        state["overflow"] = False
+        return result
+
+    return wait, take_dirty
+
+def polling_watcher(base_path, build_dirs=None):
+    # Folder mtimes change whenever a scan is added, removed or renamed, so stat'ing the folders
+    # the last build saw is enough; new subfolders show up as a change of their parent.
+    # build_dirs() returns those folders; by default they come from the saved manifest.
+    known = {}
+    dirty = set()
+
+    def snapshot():
+        mtimes = {}
+        for key in (build_dirs() if build_dirs else load_manifest(base_path)["dirs"]):
+            try:
+                mtimes[key] = os.stat(os.path.join(base_path, key)).st_mtime_ns
+            except OSError:
+                mtimes[key] = None
+        return mtimes
+
+    def wait(timeout):
+        if not known: known.update(snapshot())
+        deadline = time.time() + timeout
+        while True:
+            current = snapshot()
+            changed = {key for key in current.keys() | known.keys() if current.get(key) != known.get(key)}
+            if changed:
+                known.clear()
+                known.update(current)
+                # A deleted folder dirties its parent too, so the parent is re-read
+                dirty.update(changed | {key.rpartition("/")[0] for key in changed})
+                return True
+            if time.time() >= deadline: return False
+            time.sleep(min(WATCH_POLL_SECONDS, max(0, deadline - time.time())))
+
+    def take_dirty():
+        result = set(dirty)
+        dirty.clear()
+        known.clear()  # The rebuild updates the manifest, take a fresh snapshot from it
+        return result
+
+    return wait, take_dirty
+
+def watch_and_rebuild(push=False, poll=False, **build_options):
+    print("--- Watch Mode (Ctrl+C to stop) ---")
+    changes = generate_and_update(**build_options)
+    if changes is None:
+        return
+    watcher = None if poll else inotify_watcher(SCRIPT_DIR)
+    print("   Using inotify." if watcher else f"   Polling every {WATCH_POLL_SECONDS}s.")
+    # Polling stats the folders the last build saw; kept here so each poll doesn't re-read the whole manifest
+    build = {"dirs": changes["dirs"]}
+    wait, take_dirty = watcher or polling_watcher(SCRIPT_DIR, lambda: build["dirs"])
+
+    # Changes from every rebuild since the last upload, pushed together
+    last_push = 0
+    unpushed = changes if push else new_changes()
+    rebuild_failed = False
+    try:
+        while True:
+            push_pending = bool(changed_paths(unpushed))
+            if push_pending and time.time() - last_push >= WATCH_PUSH_INTERVAL:
+                push_to_github(unpushed)
+                last_push = time.time()
+                unpushed = new_changes()
+                push_pending = False
+            timeout = max(1, last_push + WATCH_PUSH_INTERVAL - time.time()) if push_pending else 3600
+            if not wait(timeout): continue
+
+            # Debounce: a photographer copying a batch of scans produces a burst of events, rebuild once it's quiet
+            while wait(WATCH_DEBOUNCE_SECONDS): pass
+            dirty = take_dirty()
+            if rebuild_failed: dirty = None  # The failed build's folders were never rescanned, so check everything
+            print(f"\n--- Change detected in {'unknown folders' if dirty is None else f'{len(dirty)} folder(s)'}, rebuilding ---")
+            try:
+                changes = generate_and_update(dirty=dirty, **build_options)
+            except Exception:
+                # e.g. a scan deleted halfway through; keep watching, the next change rebuilds again
+                traceback.print_exc()
+                print("❌ Rebuild failed, still watching.")
+                changes = None
+            rebuild_failed = changes is None
+            if changes:
+                build["dirs"] = changes["dirs"]
+            if changes and push:
+                merge_changes(unpushed, changes)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+# --- SERVE MODE ---
+# A local preview of the shop: a threaded HTTP server over the vault folder. The generated files (index.html,
+# sw.js, inventory/) come from an in-memory build instead of disk, so previewing never touches what gets
+# uploaded. Responses carry ETag/Last-Modified and answer conditional requests with 304, originals support
+# Range requests, and generated files are gzip/brotli compressed the first time a browser asks for them.
+
+def is_generated_path(rel_path):
+    # Files a build writes next to the cards, and their .gz/.br copies. Serve mode only serves the in-memory build's,
+    # never ones an earlier real build left on disk (derived/ is content-addressed, so thumbnails are never stale).
+    name = rel_path.removesuffix('.gz').removesuffix('.br')
+    return name in ('index.html', SERVICE_WORKER_FILE, LOT_IDS_FILE) or rel_path.split("/")[0] == INVENTORY_DIR
+
+def preview_assets(files, old_assets):
+    # files: web path -> bytes from an in-memory build. Unchanged files keep their entry, so their
+    # Last-Modified stays put and their compressed variants don't have to be made again.
+    assets = {}
+    now = time.time()
+    for rel_path, body in files.items():
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        old = old_assets.get(rel_path)
+        if old and old["etag"] == etag:
+            assets[rel_path] = old
+            continue
+        content_type = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        assets[rel_path] = {"body": body, "etag": etag, "modified": now, "type": content_type + "; charset=utf-8",
+                            "variants": {}, "lock": threading.Lock()}
+    return assets
+
+def compressed_variant(asset, encoding):
+    # Compressed once at the highest level, then served from memory
+    with asset["lock"]:
+        body = asset["variants"].get(encoding)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(asset["body"], quality=11)
+            else:
+                body = gzip.compress(asset["body"], compresslevel=9, mtime=0)
+            asset["variants"][encoding] = body
+    return body
+
+def accepted_encoding(header):
+    # Best encoding the client accepts: brotli, then gzip, else None for the plain body
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0: continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ('br' in accepted or '*' in accepted): return 'br'
+    if 'gzip' in accepted or '*' in accepted: return 'gzip'
+    return None
+
+def parse_range(header, size):
+    # (start, end) inclusive for a single "bytes=" range, None to send the whole file,
+    # or False if the range lies outside the file. Multi-range requests get the whole file.
+    if not header or not header.startswith("bytes=") or "," in header: return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size: return False
+    return start, end
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    # One instance per request; server.site["assets"] is swapped as a whole after every rebuild
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real host
+
+    def do_GET(self):
+        try:
+            self.respond(send_body=True)
+        except ConnectionError:
+            self.close_connection = True  # The browser went away mid-download (e.g. a cancelled image)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown out the rebuild output, and slows down load tests
+
+    def respond(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        rel_path = urllib.parse.unquote(url.path).lstrip("/")
+        if not rel_path or rel_path.endswith("/"):
+            rel_path += "index.html"
+        immutable = rel_path.startswith(DERIVED_DIR + "/") or "v=" in url.query
+        cache_control = SERVE_IMMUTABLE if immutable else SERVE_REVALIDATE
+
+        asset = self.server.site["assets"].get(rel_path)
+        if asset is not None:
+            self.send_asset(asset, cache_control, send_body)
+            return
+        if is_generated_path(rel_path):
+            self.send_empty(404)
+            return
+        # Anything hidden, the scripts and the build cache stay private
+        parts = rel_path.split("/")
+        if any(part in ("", ".", "..") or part.startswith(".") or part in IGNORE_LIST or "\\" in part or ":" in part for part in parts):
+            self.send_empty(404)
+            return
+        path = os.path.join(SCRIPT_DIR, *parts)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_empty(404)
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            self.send_file(f, st, mimetypes.guess_type(path)[0] or 'application/octet-stream', cache_control, send_body)
+
+    def not_modified(self, etag, modified):
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(modified) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_validators(self, etag, modified, cache_control):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(modified, usegmt=True))
+        self.send_header("Cache-Control", cache_control)
+
+    def send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_asset(self, asset, cache_control, send_body):
+        encoding = accepted_encoding(self.headers.get("Accept-Encoding"))
+        # Each encoding is a different body, so it gets its own ETag
+        etag = asset["etag"] if encoding is None else f'{asset["etag"][:-1]}-{encoding}"'
+        if self.not_modified(etag, asset["modified"]):
+            self.send_response(304)
+            self.send_validators(etag, asset["modified"], cache_control)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        body = asset["body"] if encoding is None else compressed_variant(asset, encoding)
+        self.send_response(200)
+        self.send_header("Content-Type", asset["type"])
+        self.send_validators(etag, asset["modified"], cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def send_file(self, f, st, content_type, cache_control, send_body):
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(304)
+            self.send_validators(etag, st.st_mtime, cache_control)
+            self.end_headers()
+            return
+        byte_range = parse_range(self.headers.get("Range"), st.st_size)
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range != etag and if_range != email.utils.formatdate(st.st_mtime, usegmt=True):
+            byte_range = None  # The file changed since the client's partial copy, send all of it
+        if byte_range is False:
+            self.send_empty(416, [("Content-Range", f"bytes */{st.st_size}")])
+            return
+        start, end = byte_range or (0, st.st_size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_validators(etag, st.st_mtime, cache_control)
+        self.send_header("Accept-Ranges", "bytes")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body: return
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(remaining, 256 * 1024))
+            if not chunk: break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+def rebuild_preview(site, preview, dirty=None, **build_options):
+    changes = generate_and_update(dirty=dirty, preview=preview, **build_options)
+    if changes is None:
+        return False
+    site["assets"] = preview_assets(changes["memory"], site["assets"])
+    return True
+
+def serve_preview(port=SERVE_PORT, poll=False, **build_options):
+    print("--- Serve Mode (Ctrl+C to stop) ---")
+    mimetypes.add_type('image/webp', '.webp')  # Missing from older Pythons' table
+    site = {"assets": {}}
+    preview = {}
+    if not rebuild_preview(site, preview, **build_options):
+        return
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), PreviewHandler)
+    except OSError as e:
+        print(f"❌ Could not start the server on port {port}: {e}")
+        return
+    server.daemon_threads = True
+    server.site = site
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    watcher = None if poll else inotify_watcher(SCRIPT_DIR)
+    wait, take_dirty = watcher or polling_watcher(SCRIPT_DIR, lambda: preview["manifest"]["dirs"])
+    print(f"\n✅ Previewing at http://localhost:{port}/ ({'inotify' if watcher else f'polling every {WATCH_POLL_SECONDS}s'}, nothing is uploaded)")
+    print(f"   Page and inventory are kept in memory; thumbnails for new scans are written to {DERIVED_DIR}/ like a normal build.")
+    try:
+        while True:
+            if not wait(3600): continue
+            while wait(WATCH_DEBOUNCE_SECONDS): pass
+            dirty = take_dirty()
+            print(f"\n--- Change detected in {'unknown folders' if dirty is None else f'{len(dirty)} folder(s)'}, rebuilding preview ---")
+            rebuild_preview(site, preview, dirty, **build_options)
+    except KeyboardInterrupt:
+        print("\nStopped serving.")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild index.html from the card folders and upload it to GitHub.")
+    parser.add_argument('--sharded', action='store_true', default=SHARDED_INVENTORY,
+                        help="write each folder to inventory/<id>.json and load it on demand")
+    parser.add_argument('--compact', action='store_true', default=COMPACT_INVENTORY,
+                        help="minified, prefix-deduplicated inventory instead of pretty-printed JSON")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and rebuild whenever the card folders change")
+    parser.add_argument('--poll', action='store_true',
+                        help="with --watch or --serve: poll folders instead of using inotify (needed on network shares)")
+    parser.add_argument('--push', action='store_true',
+                        help=f"with --watch: also upload to GitHub, at most every {WATCH_PUSH_INTERVAL // 60} minutes")
+    parser.add_argument('--serve', action='store_true',
+                        help="preview the shop on a local web server, rebuilt in memory when the folders change (never uploads; "
+                             "thumbnails for new scans are still written to derived/)")
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help=f"with --serve: port to listen on (default {SERVE_PORT})")
+    parser.add_argument('--fix-filenames', action='store_true', default=FIX_FILENAMES,
+                        help="replace spaces in image filenames with underscores while scanning (like fix_filenames.py)")
+    parser.add_argument('--optimize', action='store_true', default=OPTIMIZE_ORIGINALS,
+                        help="losslessly recompress the original images and strip their metadata (JPEG needs jpegtran)")
+    parser.add_argument('--duplicates', action='store_true', default=FIND_DUPLICATES,
+                        help=f"report images that look like the same lot (list saved to {DUPLICATE_REPORT_FILE})")
+    parser.add_argument('--undo-renames', action='store_true',
+                        help="put back the names changed by the last --fix-filenames or fix_filenames.py run, then stop")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"time each build phase and git command, count folders, files and stat calls, save to {PROFILE_FILE}")
+    parser.add_argument('--cprofile', action='store_true',
+                        help=f"with --profile: also save cProfile stats to {PROFILE_STATS_FILE}")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
     try:
-        if generate_and_update():
-            push_to_github()
+        args = parse_args()
+        profiling = start_profile(args.cprofile) if args.profile else None
+        try:
+            if args.undo_renames:
+                undo_renames(SCRIPT_DIR)
+            elif args.serve:
+                serve_preview(port=args.port, poll=args.poll, sharded=args.sharded, compact=args.compact, duplicates=args.duplicates)
+            elif args.watch:
+                watch_and_rebuild(push=args.push, poll=args.poll, sharded=args.sharded, compact=args.compact, fix_filenames=args.fix_filenames,
+                                  optimize=args.optimize, duplicates=args.duplicates)
+            else:
+                changes = generate_and_update(sharded=args.sharded, compact=args.compact, fix_filenames=args.fix_filenames,
+                                              optimize=args.optimize, duplicates=args.duplicates)
+                if changes is not None:
+                    with profile_phase("push"):
+                        push_to_github(changes)
+        finally:
+            if profiling:
+                finish_profile(SCRIPT_DIR, profiling)
     except Exception:
         traceback.print_exc()
     